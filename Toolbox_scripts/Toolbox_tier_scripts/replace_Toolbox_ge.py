@@ -4,13 +4,16 @@ replacement table/dictionary. Does this iteratively for files in specified
 directories.
 
 Assumptions:
-    - Corpus files are in TXT format and interlinearized, and file names begin
-    with an ISO code followed by a dash, i.e.: kuf-Texts.txt
+    - Corpus files are in TXT format (or compressed as .txt.gz, .txt.xz or
+    .txt.zst, the new files are compressed the same way) and interlinearized,
+    and file names begin with an ISO code followed by a dash, i.e.: kuf-Texts.txt
     - Replacement tables are in XLSX format, filenames begin with an ISO code
     followed by a dash, i.e.: kuf-Replacements.xlsx
     - Corpus files are in the 'corpath' folder
     - Replacement tables are in the 'dicpath' folder
     - New corpus files and logs are written to the 'wripath' folder
+    - Corpus files are read with the default encoding of open(), unless the
+    script is run with --detect-encoding
 
 Possibly required adjustments:
     - line 109, 255, 304: adjust the list of tiers according to corpus file's format
@@ -22,12 +25,16 @@ Possibly required adjustments:
 import os, re, sys, shutil, string, logging, glob
 import pandas as pd
 from collections import OrderedDict
-from chardet.universaldetector import UniversalDetector
+# toolbox_io is in the folder above this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import toolbox_io
 
 # set the paths where files will be read/written
 corpath = "Corpus_files/"# path for Toolbox corpus files
 dicpath = "Dictionaries/"# path for Toolbox replacement dictionaries (in XLSX format)
 wripath = "Output_files/"# path for new Toolbox corpus files
+# guess the encoding of the corpus files instead of using the default one
+detect = "--detect-encoding" in sys.argv[1:]
 
 # # make the output directory if it doesn't exist
 # if not os.path.exists(wripath):
@@ -161,13 +168,22 @@ def _add_morphemes():
     else:
         morpheme_tiers = {"\\mb", "\\ge", "\\ps", "\\lxid"}
 
-    # go through every morpheme type tier
-    for tier in morpheme_tiers:
+    # go through every morpheme type tier, \lxid after \mb
+    for tier in sorted(morpheme_tiers, key=lambda tier: tier == "\\lxid"):
         if tier not in ref:
             continue
 
         data = ref[tier]
 
+        # \lxid values have no clitic/affix markers (= and -) to group them
+        # into m-words, so they are grouped like the morphemes of \mb
+        if tier == "\\lxid" and words and all("\\mb" in m for w, m in words):
+            units = data.split()
+            if len(units) == sum(len(m["\\mb"]) for w, m in words):
+                for word, morphemes in words:
+                    morphemes[tier], units = units[:len(morphemes["\\mb"])], units[len(morphemes["\\mb"]):]
+                continue
+
         # get regex & iterator
         # for extracting morphemes per word (aka m-words)
         regex = re.compile(r"((\S+(\s+[=-]\s+|[=-]\s+))+(\S+(\s+[=-]|)+|\s+\S+)|\S+)")
@@ -360,9 +376,8 @@ def get_repdict(dicfile, lex, old, new):
 
     return pdict
 
-corpfiles = []
-for fn in glob.glob(corpath+"*.txt"):
-    corpfiles.append(fn)
+# plain and compressed (.gz, .xz, .zst) corpus files
+corpfiles = toolbox_io.corpus_files(corpath)
 
 dictfiles = []
 for fn in glob.glob(dicpath+"*.xlsx"):
@@ -372,12 +387,12 @@ for tbpath in corpfiles:
     tagslist = []
     tbiso = tbpath[len(corpath):].split("-")[0]
     # get the complete list of tiers in the dataset file
-    xfile = open(tbpath, "r")#, encoding=encoding)#"utf-8")#"utf-8")
-    for zline in xfile:
-        templine = re.split("\s+", zline)
-        if '\\' in templine[0]:
-            if templine[0] not in tagslist:
-                tagslist.append(templine[0])
+    with toolbox_io.open_corpus(tbpath, detect) as xfile:
+        for zline in xfile:
+            templine = re.split("\s+", zline)
+            if '\\' in templine[0]:
+                if templine[0] not in tagslist:
+                    tagslist.append(templine[0])
     print(tagslist)
 
     for dicfile in dictfiles:
@@ -385,25 +400,9 @@ for tbpath in corpfiles:
         if tbiso == diciso:
             tbwpath = wripath+tbpath[len(corpath):]
 
-            # detects encoding
-            detector = UniversalDetector()
-            # reuse the detector by a reset
-            detector.reset()
-
-            # read (some) lines in binary mode to detect encoding
-            with open(tbpath, "rb") as f:
-                for line in f:
-                    detector.feed(line)
-                    if detector.done:
-                        break
-
-            detector.close()
-
-            # guessed encoding
-            encoding = detector.result["encoding"]
-
-            tfile = open(tbpath, "r")#, encoding=encoding)#"utf-8")#
-            tbwrite = open(tbwpath, "w", encoding="utf-8")#"utf-8")
+            # open the (compressed) file, the new file is compressed like it
+            tfile = toolbox_io.open_corpus(tbpath, detect)
+            tbwrite = toolbox_io.open_output(tbwpath)
 
             logger = set_logger()
             # the following function gets the replacement columns from the excel spreadsheet
@@ -433,3 +432,6 @@ for tbpath in corpfiles:
 
                 # write (un)changed utterance back to file
                 write_file(tbwrite, rebuild=False)
+
+            tfile.close()
+            tbwrite.close()
@@ -0,0 +1,164 @@
+"""
+Script adds an \\lxid tier to corpus files that only have \\mb, \\ge and \\ps
+tiers, by looking up every morpheme in the dictionary, so that older texts can
+be used with the scripts that identify items by their lexical ID (i.e. the
+replace_Toolbox_xx.py scripts, which skip utterances without \\lxid).
+
+The dictionary is indexed on (\\lx, \\ge, \\ps) of every entry with an \\lxid.
+Morphemes are looked up with and without their clitic/affix markers (= and -),
+first on form, gloss and part of speech, then on form and part of speech, form
+and gloss, and finally on the form alone. The first lookup that finds entries
+decides: one entry is a match, more than one is ambiguous. Ambiguous and
+unmatched morphemes get '***' (as in Toolbox), boundary markers ('-' and '=')
+get themselves, and all of them are written to a report.
+
+Usage (from the Toolbox_scripts folder):
+    python add_lxid.py
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder, the dictionary of a corpus file
+    is 'dicpath'/<iso>-Dictionary.txt
+    - New corpus files, realigned with the new tier, and the report
+    (lxid_report.csv) are written to the 'wripath' folder
+    - Utterances that already have an \\lxid tier, or alignment errors, are
+    written unchanged
+"""
+import os, csv, argparse
+import toolbox_io
+from lexicon import Lexicon
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+dicpath = "Dictionaries/"# path for Toolbox dictionaries
+wripath = "Output_files/"# path for new Toolbox corpus files
+
+# the value for morphemes without a unique entry
+unknown = "***"
+
+def bare(value):
+    """Strip clitic/affix markers from a form, gloss or tag, i.e. 'ka=' -> 'ka'."""
+    return value.strip().strip("=-")
+
+class LxidIndex(object):
+    """Index of dictionary entries by (form, gloss, part of speech)."""
+
+    # the lookups, from most to least specific
+    levels = ((0, 1, 2), (0, 2), (0, 1), (0,))
+
+    def __init__(self, entries):
+        """Build the index from the (lx, ge, ps, lxid) tuples of the entries."""
+        self.index = {}
+        for lx, ge, ps, lxid in entries:
+            values = (bare(lx), bare(ge), bare(ps))
+            for level in self.levels:
+                key = (level,) + tuple(values[i] for i in level)
+                self.index.setdefault(key, set()).add(lxid)
+
+    @classmethod
+    def from_dictionary(cls, dfile):
+        """Build the index from a Toolbox dictionary (or its lexicon snapshot)."""
+        lexicon = Lexicon.load(dfile)
+        entries = []
+        for lxid, num in lexicon.lxid.items():
+            fields = lexicon.fields(num)
+            entries.append((fields["\\lx"], fields.get("\\ge", ""), fields.get("\\ps", ""), lxid))
+        return cls(entries)
+
+    def lookup(self, mb, ge, ps):
+        """Return the lxids of the first lookup that finds entries."""
+        values = (bare(mb), bare(ge), bare(ps))
+        for level in self.levels:
+            found = self.index.get((level,) + tuple(values[i] for i in level))
+            if found:
+                return sorted(found)
+        return []
+
+def add_lxids(words, index):
+    """Add an \\lxid tier to the words of an utterance.
+
+    Returns the list of (word index, morpheme index, status, candidates) of
+    the morphemes that could not be matched.
+
+    words (list): the words of an utterance, from toolbox_io.build_words
+    index (LxidIndex): the dictionary index
+    """
+    problems = []
+    for w, (word, morphemes) in enumerate(words):
+        lxids = []
+        for m, mb in enumerate(morphemes["\\mb"]):
+            # boundary markers written as morphemes of their own
+            if mb in ("-", "="):
+                lxids.append(mb)
+                continue
+            found = index.lookup(mb, morphemes["\\ge"][m], morphemes["\\ps"][m])
+            if len(found) == 1:
+                lxids.append(found[0])
+            else:
+                lxids.append(unknown)
+                problems.append((w, m, "ambiguous" if found else "unmatched", " ".join(found)))
+        morphemes["\\lxid"] = lxids
+    return problems
+
+def add_file(tbpath, outpath, index, report):
+    """Add \\lxid tiers to a corpus file, returns (matched, not matched) counts.
+
+    tbpath (str): the corpus file
+    outpath (str): the new corpus file
+    index (LxidIndex): the dictionary index
+    report (csv.writer): the report of morphemes that could not be matched
+    """
+    matched = failed = 0
+    with toolbox_io.open_corpus(tbpath) as tfile, toolbox_io.open_output(outpath) as tbwrite:
+        for ref in toolbox_io.iter_records(tfile):
+            if "\\ref" not in ref or "\\lxid" in ref:
+                toolbox_io.write_record(tbwrite, ref)
+                continue
+            words = toolbox_io.build_words(ref)
+            tiers = toolbox_io.utterance_tiers(ref)
+            error = None
+            if not {"\\mb", "\\ge", "\\ps"} <= set(tiers):
+                error = "morpheme tiers missing"
+            error = error or toolbox_io.check_words(ref, words, tiers)
+            if error:
+                report.writerow([tbpath, ref["\\ref"].strip(), "", "", "", "", "", error, ""])
+                toolbox_io.write_record(tbwrite, ref)
+                continue
+
+            problems = add_lxids(words, index)
+            for w, m, status, candidates in problems:
+                morphemes = words[w][1]
+                report.writerow([tbpath, ref["\\ref"].strip(), w, m, morphemes["\\mb"][m],
+                                 morphemes["\\ge"][m], morphemes["\\ps"][m], status, candidates])
+            failed += len(problems)
+            matched += sum(len(morphemes["\\mb"]) for word, morphemes in words) - len(problems)
+            toolbox_io.write_record(tbwrite, ref, words, tiers + ("\\lxid",))
+    return matched, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add an \\lxid tier to corpus files from the dictionary.")
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--dict", help="the Toolbox dictionary (default <iso>-Dictionary.txt)")
+    parser.add_argument("--output", default=wripath, help="folder for the new corpus files")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    indexes = {}
+    with open(os.path.join(args.output, "lxid_report.csv"), "w", encoding="utf-8", newline="") as rfile:
+        report = csv.writer(rfile)
+        report.writerow(["file", "ref", "word", "morpheme", "mb", "ge", "ps", "status", "candidates"])
+        for tbpath in toolbox_io.corpus_files(args.corpus):
+            iso = toolbox_io.file_iso(tbpath)
+            dfile = args.dict or os.path.join(dicpath, iso + "-Dictionary.txt")
+            if not os.path.exists(dfile):
+                print("{}: no dictionary {}".format(tbpath, dfile))
+                continue
+            # the dictionary of each language is only indexed once
+            if dfile not in indexes:
+                indexes[dfile] = LxidIndex.from_dictionary(dfile)
+            outpath = os.path.join(args.output, os.path.basename(tbpath))
+            matched, failed = add_file(tbpath, outpath, indexes[dfile], report)
+            print("{}: {} morphemes matched, {} not matched".format(outpath, matched, failed))
+
+if __name__ == "__main__":
+    main()
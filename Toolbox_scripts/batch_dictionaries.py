@@ -0,0 +1,142 @@
+# Script for running the dictionary scripts (dict_replace_new.py,
+# dict_replace.py and check_terms.py) on many dictionaries at once, without
+# waiting for the field markers to be checked. The jobs run in parallel, and
+# the markers of each dictionary are written to a report file instead.
+# Python 3
+#
+# Either pass (dictionary, replacement table) pairs on the command line:
+#   python batch_dictionaries.py --pair Dictionaries/kha-Dictionary.txt
+#       Dictionaries/kha-replacetable.xlsx --columns lx ps old_ps new_ps
+# or a JSON config file with a list of jobs:
+#   python batch_dictionaries.py --config jobs.json
+# where jobs.json looks like
+#   {"workers": 4,
+#    "jobs": [{"script": "dict_replace_new", "dict": "Dictionaries/kha-Dictionary.txt",
+#              "table": "Dictionaries/kha-replacetable.xlsx",
+#              "columns": ["lxid", "ge", "old_ge", "new_ge"],
+#              "markers": {"lx": "\\lx ", "ps": "\\ps ", "ge": "\\ge "}},
+#             {"script": "check_terms", "dict": "Dictionaries/kha-Dictionary.txt",
+#              "pos": "all"}]}
+# Each job may also set "output" (the new dictionary) and "report" (the
+# markers report). Jobs without "markers" or "columns" use the defaults of
+# their script. Jobs on the same dictionary write their markers reports to
+# Output_files/<dictionary>_<job no.>_markers.txt, so that they don't
+# overwrite each other's.
+import os, sys, json, argparse, traceback
+from concurrent.futures import ProcessPoolExecutor
+
+# path to store the outputs and the batch report
+path = "Output_files/"
+# the scripts that can be run, the first one is the default
+scripts = ('dict_replace_new', 'dict_replace', 'check_terms')
+
+"""
+A function that turns a job from the config into the command line arguments
+of its script.
+  Arguments are:
+    'job': a dict with the keys 'script', 'dict' and the script's options
+"""
+def job_args(job):
+    args = ["--yes", "--dict", job['dict']]
+    if job.get('script', scripts[0]) == 'check_terms':
+        args = [job.get('pos', 'all')] + args
+        if job.get('split'):
+            args.append("--split")
+    else:
+        args += ["--table", job['table']]
+        if job.get('output'):
+            args += ["--output", job['output']]
+        if job.get('columns'):
+            args += ["--columns"] + list(job['columns'])
+    if job.get('markers'):
+        args += ["--markers", json.dumps(job['markers'])]
+    if job.get('report'):
+        args += ["--report", job['report']]
+    return args
+
+"""
+A function that runs one job, in a worker process.
+  Arguments are:
+    'job': a dict with the keys 'script', 'dict' and the script's options
+  Returns the job, the written files and the error, if any.
+"""
+def run_job(job):
+    script = job.get('script', scripts[0])
+    try:
+        if script not in scripts:
+            raise ValueError("unknown script '{}'".format(script))
+        module = __import__(script)
+        return job, module.main(job_args(job)), None
+    except BaseException:
+        return job, [], traceback.format_exc()
+
+"""
+A function that builds jobs from (dictionary, replacement table) pairs.
+  Arguments are:
+    'pairs': a list of [dictionary, table] lists
+    'script': the script to run
+    'columns': the columns of the replacement tables, or None
+"""
+def pair_jobs(pairs, script, columns):
+    jobs = []
+    dicts = [d for d, t in pairs]
+    for dfile, table in pairs:
+        job = {'script': script, 'dict': dfile, 'table': table}
+        # name the new dictionaries after the table if a dictionary is used twice
+        if dicts.count(dfile) > 1:
+            workfile = os.path.basename(dfile)[:-4]
+            tablename = os.path.splitext(os.path.basename(table))[0]
+            job['output'] = path+workfile+"_"+tablename+"_NEW.txt"
+        if columns:
+            job['columns'] = columns
+        jobs.append(job)
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the dictionary scripts on many dictionaries in parallel.")
+    parser.add_argument("--config", help="JSON file with the jobs to run")
+    parser.add_argument("--pair", nargs=2, action="append", default=[], metavar=("DICT", "TABLE"),
+                        help="a dictionary and its replacement table (can be repeated)")
+    parser.add_argument("--script", default=scripts[0], choices=scripts[:2],
+                        help="the script to run for --pair")
+    parser.add_argument("--columns", nargs=4, metavar=("LX", "TIER", "OLD", "NEW"),
+                        help="the columns of the replacement tables for --pair")
+    parser.add_argument("--workers", type=int, help="number of jobs to run in parallel")
+    parser.add_argument("--report", default=path+"batch_report.txt", help="the batch report")
+    args = parser.parse_args(argv)
+
+    config = {'jobs': []}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as cfile:
+            config = json.load(cfile)
+    jobs = config['jobs'] + pair_jobs(args.pair, args.script, args.columns)
+    if not jobs:
+        parser.error("no jobs, use --config or --pair")
+    workers = args.workers or config.get('workers') or os.cpu_count()
+    # the jobs run at the same time, so jobs on the same dictionary need their own markers report
+    dicts = [job['dict'] for job in jobs]
+    for num, job in enumerate(jobs):
+        if dicts.count(job['dict']) > 1 and not job.get('report'):
+            workfile = os.path.basename(job['dict'])[:-4]
+            job['report'] = path+workfile+"_"+str(num+1)+"_markers.txt"
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    failed = 0
+    with ProcessPoolExecutor(min(workers, len(jobs))) as pool, \
+            open(args.report, 'w', encoding='utf-8') as report:
+        # write the result of every job to the report, in the order of the jobs
+        for job, written, error in pool.map(run_job, jobs):
+            name = "{} {}".format(job.get('script', scripts[0]), job['dict'])
+            if error:
+                failed += 1
+                report.write(name+" FAILED\n"+error+"\n")
+                print(name, "FAILED")
+            else:
+                report.write(name+" ok: "+", ".join(written)+"\n")
+                print(name, "ok")
+    print("{} jobs, {} failed, see {} and the *_markers.txt reports".format(len(jobs), failed, args.report))
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
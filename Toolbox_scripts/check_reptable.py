@@ -0,0 +1,138 @@
+"""
+Script checks replacement tables before a replacement run, and reports every
+row that would be dropped or would not change anything:
+    - conflict: the same item (lxid) has different new_<tier> values, only the
+    first row is used by get_repdict
+    - duplicate: the same item occurs in more than one row with different
+    old_<tier> values, only the first row is used by get_repdict
+    - unused: the (item, old_<tier>) pair never occurs in the corpus files
+    - unknown: the item is not an \\lxid (or \\lx) in the dictionary
+
+Usage (from the Toolbox_scripts folder):
+    python check_reptable.py [Dictionaries/kha-replacetable.xlsx ...]
+
+Assumptions:
+    - Without arguments, all Dictionaries/*-replacetable*.xlsx are checked
+    - The dictionary of a table is 'dicpath'/<iso>-Dictionary.txt and its corpus
+    files are the 'corpath' files beginning with the same ISO code
+    - The problems are written to 'wripath'/<table>_problems.csv
+"""
+import os, sys, glob, argparse
+import toolbox_io
+from lexicon import Lexicon
+from export_tokens import iter_tokens, columns
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+dicpath = "Dictionaries/"# path for Toolbox dictionaries and replacement tables
+wripath = "Output_files/"# path for the reports
+
+def dictionary_items(dfile):
+    """Return the sets of \\lxid and \\lx values of a Toolbox dictionary.
+
+    dfile (str): the Toolbox dictionary
+    """
+    lexicon = Lexicon.load(dfile)
+    return set(lexicon.lxid), {lx for lx, hm in lexicon.lx_hm}
+
+def corpus_pairs(files, lex="lxid"):
+    """Return the set of (tier, item, value) triples observed in corpus files.
+
+    files (list): the corpus files
+    lex (str): 'lxid' to identify items by \\lxid, 'lx' by \\mb
+    """
+    key = columns.index("lxid" if lex == "lxid" else "mb")
+    tiers = [(tier, columns.index(tier)) for tier in ("tx", "mb", "ph", "ge", "ps")]
+    pairs = set()
+    for tbpath in files:
+        for row in iter_tokens(tbpath):
+            if row[key] is not None:
+                pairs.update((tier, row[key], row[i]) for tier, i in tiers)
+    return pairs
+
+def check_table(tdf, lex="lxid", pairs=None, items=None):
+    """Return the problems of a replacement table as a DataFrame.
+
+    tdf (DataFrame): the replacement table, read with toolbox_io.read_reptable
+    lex (str): the column identifying the item, 'lxid' or 'lx'
+    pairs (set): the (tier, item, value) triples of the corpus, or None
+    items (set): the items of the dictionary, or None
+    """
+    import pandas as pd
+
+    problems = []
+    # the row numbers as shown in Excel, with the header in row 1
+    rows = tdf.index + 2
+    tiers = [col[4:] for col in tdf.columns
+             if col.startswith("old_") and "new_" + col[4:] in tdf.columns]
+    for tier in tiers:
+        old, new = "old_" + tier, "new_" + tier
+        # stripped as in compile_rules.table_rules, so that 'n ' and 'n' are the same rule
+        part = tdf[[lex, old, new]].dropna(subset=[lex, old]).apply(lambda col: col.str.strip())
+
+        # items with more than one new value, or more than one old value
+        counts = part.groupby(lex).agg(olds=(old, "nunique"), news=(new, "nunique"))
+        for kind, col in (("conflict", "news"), ("duplicate", "olds")):
+            bad = part[part[lex].isin(counts.index[counts[col] > 1])]
+            problems.extend((rows[i], lex, kind, "\\{}: {} '{}' -> '{}'".format(
+                tier, bad.at[i, lex], bad.at[i, old], bad.at[i, new])) for i in bad.index)
+
+        # old values that never occur with the item in the corpus
+        if pairs is not None:
+            for i, item, value in part[[lex, old]].itertuples():
+                if (tier, item, value) not in pairs:
+                    problems.append((rows[i], old, "unused",
+                                     "\\{}: {} '{}' does not occur in the corpus".format(tier, item, value)))
+
+    # items that are not in the dictionary
+    if items is not None:
+        for i, item in tdf[lex].dropna().str.strip().items():
+            if item not in items:
+                problems.append((rows[i], lex, "unknown", "{} is not in the dictionary".format(item)))
+
+    result = pd.DataFrame(problems, columns=["row", "column", "problem", "detail"])
+    return result.drop_duplicates().sort_values(["row", "problem"], kind="stable")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check replacement tables for conflicts and coverage.")
+    parser.add_argument("tables", nargs="*", help="the replacement tables (XLSX)")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--dict", help="the Toolbox dictionary (default <iso>-Dictionary.txt)")
+    args = parser.parse_args(argv)
+
+    tables = args.tables or sorted(glob.glob(dicpath + "*-replacetable*.xlsx"))
+    if not os.path.exists(wripath):
+        os.makedirs(wripath)
+
+    # the dictionary and corpus are only read once per language
+    cache = {}
+    n_problems = 0
+    for table in tables:
+        iso = toolbox_io.file_iso(table)
+        if iso not in cache:
+            dfile = args.dict or os.path.join(dicpath, iso + "-Dictionary.txt")
+            items = None
+            if os.path.exists(dfile):
+                lxids, lxs = dictionary_items(dfile)
+                items = lxids if args.lex == "lxid" else lxs
+            files = [f for f in toolbox_io.corpus_files(args.corpus) if toolbox_io.file_iso(f) == iso]
+            cache[iso] = (corpus_pairs(files, args.lex) if files else None, items)
+
+        pairs, items = cache[iso]
+        tdf = toolbox_io.read_reptable(table, args.lex)
+        if args.lex not in tdf:
+            print("{}: no '{}' column".format(table, args.lex))
+            n_problems += 1
+            continue
+        problems = check_table(tdf, args.lex, pairs, items)
+        outpath = os.path.join(wripath, os.path.splitext(os.path.basename(table))[0] + "_problems.csv")
+        problems.to_csv(outpath, index=False)
+        print("{}: {} problems, see {}".format(table, len(problems), outpath))
+        for kind, count in problems["problem"].value_counts().items():
+            print("\t{}: {}".format(kind, count))
+        n_problems += len(problems)
+    return n_problems
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -1,18 +1,22 @@
 # Script to get an excel spreadsheet of all terms with a particular
 # part of speech tag from a Toolbox dictionary.
 # Python 3
-import os
-from sys import argv
-import pandas as pd
-
-# use this command line operation to type the script followed by part of speech tag
-# to auto-generate an excel spreadsheet
-script, pos = argv
+#
+# Use 'all' instead of a part of speech tag to read the dictionary once and
+# write a single workbook with one sheet per part of speech and a 'summary'
+# sheet with the number of entries per part of speech. With 'all --split'
+# one spreadsheet per part of speech is written instead. With --yes the
+# script does not ask to check the field markers, but writes them to
+# Output_files/<dictionary>_markers.txt (or --report) instead. Use --dict and
+# --markers to read another dictionary.
+# The dictionary is read with lexicon.py, which keeps a snapshot of it in
+# Output_files/, so that it is not parsed again for every part of speech.
+import os, argparse
+from collections import OrderedDict
+from lexicon import Lexicon, named_fields
 
 # path to store auto-generated spreadsheets
 path = "Output_files/"
-if not os.path.exists(path):
-    os.makedirs(path)
 # path for dictionaries
 dpath = "Dictionaries/"
 
@@ -23,65 +27,123 @@ temptext = "\n" # use this variable as a placeholder
 # these are the field markers in a given Toolbox dictionary entry
 markers = {'lx': "\\lx ", 'alt': "\\a ", 'hm': "\\hm ", 'ph': "\\ph ", 'ps': "\\ps ",
             'ge': "\\ge ", 'nt': "\\nt ", 'dt': "\\dt "}
-# print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
-with open(dfile, 'r') as tbtemp:
-    markerlist = []
-    for lt in tbtemp:
-        if lt.startswith("\\"):
-            tpline = lt.split()[0]
-            if tpline not in markerlist:
-                markerlist.append(tpline)
-    print(markerlist)
-    tbtemp.close()
-input("Check field markers and press any key to continue")
-
-# open the files
-tbfile = open(dfile, 'r')#, encoding="utf-8")
-# store the name of the file
-workfile = dfile[len(dpath):-4]
-print(workfile)
-
-num = 0
-tbdict = {'word': {}, 'pos': {}, 'gloss': {}} # initialize a dict
-headword = ""
-current = ""
-entry = {}
-for line in tbfile:
-    for k, v in markers.items():
-        # check if the line starts with one of the markers
-        if line.startswith(v):
-            current = k# make the marker the current entry
-            # if the current marker is the lexical entry
-            if k == 'lx':
-                # if the previous entry is not blank
-                if headword != "":
-                    # print(entry)
-                    # check whether the entry contains the part of speech
-                    if entry[headword]['ps'] == pos:
-                        tbdict['word'][num] = entry[headword]['lx']
-                        tbdict['pos'][num] = entry[headword]['ps']
-                        tbdict['gloss'][num] = entry[headword]['ge']
-                        # increment the counter
-                        num += 1
-                # reset the entry dict with the current lexical item as headword/key
-                entry = {}
-                headword = line[len(v):].rstrip()# get the line
-                entry[headword] = {k: headword}# build a mini-dict
-            # if the current marker is not the lexeme but one of the others
-            else:
-                # get the entry
-                tword = line[len(v):].rstrip()
-                # add it to the dict or append to existing dict entry
-                if k in entry[headword].keys():
-                    entry[headword][k] += "\n"+v+tword
-                else:
-                    entry[headword][k] = tword
-
-# print(tbdict)
-
-# convert the new tbdict to a dataframe
-posdf = pd.DataFrame.from_dict(tbdict)
-# print(posdf.columns)
-# write the dataframe to a spreadsheet
-xls_path = path+workfile+"_"+str(pos)+".xlsx"
-posdf.to_excel(xls_path, index=False)
+
+"""
+A function that adds an entry to the table of its part of speech.
+  Arguments are:
+    'tbdict': the table, a dict with 'word', 'pos' and 'gloss' columns
+    'entry': the entry dict, with the marker names as keys
+"""
+def add_row(tbdict, entry):
+    num = len(tbdict['word'])
+    tbdict['word'][num] = entry['lx']
+    tbdict['pos'][num] = entry.get('ps')
+    tbdict['gloss'][num] = entry.get('ge')
+
+"""
+A function that writes the entries of every part of speech in one pass.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'workfile': the dictionary name used for the output files
+    'split': write one spreadsheet per part of speech instead of one workbook
+    'markers': the field markers of the dictionary
+  Returns the paths of the written spreadsheets.
+"""
+def write_all_pos(dfile, workfile, split=False, markers=markers):
+    import pandas as pd
+
+    tables = OrderedDict() # one table per part of speech, in order of appearance
+    for entry in Lexicon.load(dfile).entries:
+        entry = named_fields(entry, markers)
+        pos = entry.get('ps', '')
+        if pos not in tables:
+            tables[pos] = {'word': {}, 'pos': {}, 'gloss': {}}
+        add_row(tables[pos], entry)
+
+    # the number of entries per part of speech, most frequent first
+    summary = pd.DataFrame({'pos': list(tables.keys()),
+                            'entries': [len(t['word']) for t in tables.values()]})
+    summary = summary.sort_values('entries', ascending=False, kind='stable')
+
+    if split:
+        written = []
+        for pos, tbdict in tables.items():
+            xls_path = path+workfile+"_"+sheet_name(pos)+".xlsx"
+            pd.DataFrame.from_dict(tbdict).to_excel(xls_path, index=False)
+            written.append(xls_path)
+        summary.to_excel(path+workfile+"_summary.xlsx", index=False)
+        return written+[path+workfile+"_summary.xlsx"]
+    xls_path = path+workfile+"_all.xlsx"
+    with pd.ExcelWriter(xls_path) as writer:
+        summary.to_excel(writer, sheet_name='summary', index=False)
+        used = {'summary'}
+        for pos, tbdict in tables.items():
+            # sheet names must be unique regardless of case
+            name = sheet_name(pos)
+            while name.lower() in used:
+                name = name[:28]+"_"+str(len(used))
+            used.add(name.lower())
+            pd.DataFrame.from_dict(tbdict).to_excel(writer, sheet_name=name, index=False)
+    print(xls_path)
+    return [xls_path]
+
+"""
+A function that turns a part of speech tag into a valid sheet/file name.
+  Arguments are:
+    'pos': the part of speech tag
+"""
+def sheet_name(pos):
+    name = "".join("_" if c in '[]:*?/\\' else c for c in str(pos)).strip("'")
+    return name[:31] or "no_pos"
+
+def main(argv=None):
+    import pandas as pd
+    from dict_replace_new import check_markers, write_report, load_markers
+
+    # use this command line operation to type the script followed by part of speech tag
+    # to auto-generate an excel spreadsheet
+    parser = argparse.ArgumentParser(description="Write spreadsheets of the terms in a Toolbox dictionary.")
+    parser.add_argument("pos", help="the part of speech tag, or 'all'")
+    parser.add_argument("--split", action="store_true", help="with 'all', write one spreadsheet per tag")
+    parser.add_argument("--dict", default=dfile, help="the Toolbox dictionary")
+    parser.add_argument("--markers", type=load_markers, default=markers,
+                        help="JSON object (or file) mapping marker names to markers")
+    parser.add_argument("--yes", action="store_true",
+                        help="don't wait for the markers to be checked, write them to a report")
+    parser.add_argument("--report", help="the markers report of --yes (default Output_files/<dictionary>_markers.txt)")
+    args = parser.parse_args(argv)
+    pos = args.pos
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    # store the name of the file
+    workfile = os.path.basename(args.dict)[:-4]
+
+    # print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
+    markerlist, missing = check_markers(args.dict, args.markers)
+    if args.yes:
+        write_report(args.report or path+workfile+"_markers.txt", args.dict, markerlist, missing)
+    else:
+        print(markerlist)
+        input("Check field markers and press any key to continue")
+
+    if pos == 'all':
+        return write_all_pos(args.dict, workfile, args.split, args.markers)
+    print(workfile)
+
+    tbdict = {'word': {}, 'pos': {}, 'gloss': {}} # initialize a dict
+    for entry in Lexicon.load(args.dict).entries:
+        entry = named_fields(entry, args.markers)
+        # check whether the entry contains the part of speech
+        if entry.get('ps') == pos:
+            add_row(tbdict, entry)
+
+    # convert the new tbdict to a dataframe
+    posdf = pd.DataFrame.from_dict(tbdict)
+    # write the dataframe to a spreadsheet
+    xls_path = path+workfile+"_"+str(pos)+".xlsx"
+    posdf.to_excel(xls_path, index=False)
+    return [xls_path]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Script compiles an ordered list of replacement tables into one set of rules,
+so that any number of tables costs a single pass over the corpus instead of
+one run of the replacement scripts per table.
+
+Each table may have columns for several tiers ('old_ps'/'new_ps',
+'old_ge'/'new_ge', ...). The tables are composed in the given order: if one
+table changes a to b and a later one changes b to c, the compiled rule changes
+a to c. Before anything is replaced, the following problems are reported:
+    - conflicts: rows of one table with the same item and old value but
+    different new values (the first row wins, like in get_repdict)
+    - cycles: chains that end at the value they start with (a -> b -> a),
+    which are dropped
+
+Usage (from the Toolbox_scripts folder):
+    python compile_rules.py Dictionaries/kha-pos.xlsx Dictionaries/kha-gloss.xlsx
+    python compile_rules.py Dictionaries/kha-pos.xlsx Dictionaries/kha-gloss.xlsx --apply
+
+Assumptions:
+    - The compiled rules and the report are written to the 'wripath' folder,
+    as <iso>-compiled_rules.xlsx and <iso>-compiled_rules.txt
+    - With --apply, corpus files in the 'corpath' folder that begin with the
+    ISO code of the first table are replaced and written to 'wripath'
+"""
+import os, sys, argparse
+from collections import OrderedDict
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+wripath = "Output_files/"# path for new Toolbox corpus files and the rules
+
+def table_tiers(tdf):
+    """Return the tiers a replacement table has old_/new_ columns for."""
+    return [col[4:] for col in tdf.columns
+            if col.startswith("old_") and "new_" + col[4:] in tdf.columns]
+
+def table_rules(tdf, name, lex="lxid"):
+    """Return the rules of one replacement table and its conflicts.
+
+    The rules are a dict {tier: {(item, old): new}}, the conflicts a list of
+    report lines.
+
+    tdf (DataFrame): the replacement table, read with toolbox_io.read_reptable
+    name (str): the name of the table, for the report
+    lex (str): the column identifying the item, 'lxid' or 'lx'
+    """
+    rules, conflicts = OrderedDict(), []
+    for tier in table_tiers(tdf):
+        rules[tier] = OrderedDict()
+        rows = tdf[[lex, "old_" + tier, "new_" + tier]].dropna()
+        for item, old, new in rows.itertuples(index=False):
+            item, old, new = item.strip(), old.strip(), new.strip()
+            key = (item, old)
+            if key not in rules[tier]:
+                rules[tier][key] = new
+            elif rules[tier][key] != new:
+                conflicts.append("conflict|{}|\\{}|{} '{}': '{}' kept, '{}' dropped".format(
+                    name, tier, item, old, rules[tier][key], new))
+    return rules, conflicts
+
+def compose(tables):
+    """Compose the rules of several tables, applied in order, into one set.
+
+    Returns the compiled rules {tier: {(item, old): new}}, the chain of values
+    of every rule {tier: {(item, old): [old, ..., new]}} and the report lines.
+
+    tables (list): (name, rules) tuples, the rules as returned by table_rules
+    """
+    compiled, chains, report = OrderedDict(), OrderedDict(), []
+    for name, rules in tables:
+        for tier, trules in rules.items():
+            crules = compiled.setdefault(tier, OrderedDict())
+            cchains = chains.setdefault(tier, OrderedDict())
+            # continue the chains of earlier tables that end in an old value of this table
+            for (item, old), value in crules.items():
+                if (item, value) in trules and trules[(item, value)] != value:
+                    crules[(item, old)] = trules[(item, value)]
+                    cchains[(item, old)].append(trules[(item, value)])
+            # values that were changed by earlier tables no longer occur in the
+            # corpus, so only rules for values not changed yet are added
+            for (item, old), new in trules.items():
+                if (item, old) not in crules:
+                    crules[(item, old)] = new
+                    cchains[(item, old)] = [old, new]
+
+    # drop rules that end where they start
+    for tier, crules in compiled.items():
+        for key in [key for key, new in crules.items() if new == key[1]]:
+            chain = chains[tier].pop(key)
+            del crules[key]
+            if len(chain) > 2:
+                report.append("cycle|\\{}|{}: {}".format(tier, key[0], " -> ".join(chain)))
+    return compiled, chains, report
+
+def load_rules(paths, lex="lxid"):
+    """Read and compile replacement tables, returns (compiled, chains, report).
+
+    paths (list): the replacement tables (XLSX), in the order they apply
+    lex (str): the column identifying the item, 'lxid' or 'lx'
+    """
+    tables, report = [], []
+    for path in paths:
+        rules, conflicts = table_rules(toolbox_io.read_reptable(path, lex),
+                                       os.path.basename(path), lex)
+        tables.append((os.path.basename(path), rules))
+        report.extend(conflicts)
+    compiled, chains, cycles = compose(tables)
+    return compiled, chains, report + cycles
+
+def apply_rules(words, compiled, lex="lxid"):
+    """Update words according to the compiled rules, returns the changes.
+
+    words (list): the words of an utterance, from toolbox_io.build_words
+    compiled (dict): the compiled rules {tier: {(item, old): new}}
+    lex (str): 'lxid' to identify items by \\lxid, 'lx' by \\mb
+    """
+    key = "\\lxid" if lex == "lxid" else "\\mb"
+    changes = []
+    for word, morphemes in words:
+        if key not in morphemes:
+            continue
+        # look up the items before any tier is changed
+        items = [item.lower() if lex == "lxid" else item for item in morphemes[key]]
+        for tier, rules in compiled.items():
+            units = morphemes.get("\\" + tier)
+            if not units:
+                continue
+            for num, (item, unit) in enumerate(zip(items, units)):
+                new = rules.get((item, unit))
+                if new is not None:
+                    units[num] = new
+                    changes.append((item, tier, unit, new))
+    return changes
+
+def replace_records(lines, tbwrite, compiled, lex="lxid", logger=None, select=None):
+    """Replace items in a Toolbox stream record by record, returns the no. of changes.
+
+    lines (iterable): the lines of a Toolbox file, i.e. an open file or sys.stdin
+    tbwrite (file): the file the new records are written to
+    compiled (dict): the compiled rules {tier: {(item, old): new}}
+    lex (str): 'lxid' to identify items by \\lxid, 'lx' by \\mb
+    logger (Logger): if given, every change is logged
+    select (function): if given, only utterances for which it returns True
+    are replaced, i.e. time_index.in_window
+    """
+    n_changes = 0
+    for ref in toolbox_io.iter_records(lines):
+        if "\\ref" not in ref or (select and not select(ref)):
+            toolbox_io.write_record(tbwrite, ref)
+            continue
+        words = toolbox_io.build_words(ref)
+        tiers = toolbox_io.utterance_tiers(ref)
+        # only process and realign utterances without errors
+        if toolbox_io.check_words(ref, words, tiers):
+            toolbox_io.write_record(tbwrite, ref)
+            continue
+        changes = apply_rules(words, compiled, lex)
+        for item, tier, old, new in changes:
+            if logger:
+                logger.info("changed form '{}' tier \\{} '{}' to '{}' in {}".format(
+                    item, tier, old, new, ref["\\ref"]))
+        n_changes += len(changes)
+        toolbox_io.write_record(tbwrite, ref, words, tiers)
+    return n_changes
+
+def replace_file(tbpath, outpath, compiled, lex="lxid", logger=None):
+    """Replace items in a corpus file in one pass, returns the no. of changes.
+
+    tbpath (str): the corpus file
+    outpath (str): the new corpus file
+    compiled, lex, logger: as in replace_records
+    """
+    with toolbox_io.open_corpus(tbpath) as tfile, toolbox_io.open_output(outpath) as tbwrite:
+        return replace_records(tfile, tbwrite, compiled, lex, logger)
+
+def write_rules(compiled, chains, lex, xlspath):
+    """Write the compiled rules to a spreadsheet.
+
+    compiled, chains (dict): as returned by compose
+    lex (str): the column identifying the item
+    xlspath (str): the spreadsheet
+    """
+    import pandas as pd
+
+    rows = [(item, tier, old, new, " -> ".join(chains[tier][(item, old)]))
+            for tier, rules in compiled.items() for (item, old), new in rules.items()]
+    pd.DataFrame(rows, columns=[lex, "tier", "old", "new", "chain"]).to_excel(xlspath, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile replacement tables into one set of rules.")
+    parser.add_argument("tables", nargs="+", help="the replacement tables, in the order they apply")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--apply", action="store_true", help="replace items in the corpus files")
+    parser.add_argument("--strict", action="store_true", help="don't apply the rules if there are problems")
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--output", default=wripath, help="folder for the new corpus files and the rules")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    iso = toolbox_io.file_iso(args.tables[0])
+    compiled, chains, report = load_rules(args.tables, args.lex)
+
+    # report the problems before the corpus is touched
+    rulepath = os.path.join(args.output, iso + "-compiled_rules")
+    write_rules(compiled, chains, args.lex, rulepath + ".xlsx")
+    with open(rulepath + ".txt", "w", encoding="utf-8") as rfile:
+        for line in report:
+            rfile.write(line + "\n")
+            print(line)
+    print("{} rules compiled from {} tables, {} problems, see {}.txt".format(
+        sum(len(rules) for rules in compiled.values()), len(args.tables), len(report), rulepath))
+
+    if not args.apply:
+        return 0
+    if report and args.strict:
+        print("not applied because of --strict")
+        return 1
+    for tbpath in toolbox_io.corpus_files(args.corpus):
+        if toolbox_io.file_iso(tbpath) == iso:
+            outpath = os.path.join(args.output, os.path.basename(tbpath))
+            print("{}: {} changes".format(outpath, replace_file(tbpath, outpath, compiled, args.lex)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
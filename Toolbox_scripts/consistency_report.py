@@ -0,0 +1,129 @@
+"""
+Script finds morphemes that are annotated inconsistently across the corpus,
+i.e. the same \\lxid glossed '3sg.M' in one utterance and '3sg.N' in another,
+or tagged 'pro' in one and 'n' in another.
+
+The corpus files are read in parallel, each worker counts the (lxid, mb, ge, ps)
+analyses of its file, and the counts are added up. For every lxid with more
+than one analysis, the most frequent analysis is taken as the right one and
+every other analysis is written to a spreadsheet in the format of a
+replacement table: one row per analysis, with the analysis as
+old_mb/old_ge/old_ps and the most frequent one as new_mb/new_ge/new_ps, its
+frequency and example \\ref ids. After checking (and deleting the rows that
+should not change) it can be used with compile_rules.py (or toolbox_filter.py,
+frozen_rules.py and watch_corpus.py), which apply every row; the tiers a row
+does not change are left out of the compiled rules.
+
+The replace_Toolbox_xx.py scripts only use the first row of every lxid, so
+they only apply the most frequent of the wrong analyses (the rows of an lxid
+are sorted by frequency), and nothing if that row does not change their tier.
+
+Usage (from the Toolbox_scripts folder):
+    python consistency_report.py [Output_files/consistency.xlsx|.csv]
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder, the report is written to 'wripath'
+    - With '--key lx' morphemes are identified by their \\mb form instead of
+    their \\lxid, for corpora without an \\lxid tier
+"""
+import os, argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import toolbox_io
+from export_tokens import iter_tokens, columns
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+wripath = "Output_files/consistency.xlsx"# path for the report
+
+# the number of example refs kept per analysis
+n_examples = 3
+
+def count_file(tbpath, key="lxid"):
+    """Count the analyses of every morpheme in a corpus file.
+
+    Returns a Counter of (item, mb, ge, ps) tuples and a dict with up to
+    n_examples refs per tuple.
+
+    tbpath (str): the corpus file
+    key (str): 'lxid' to identify morphemes by \\lxid, 'lx' by \\mb
+    """
+    k = columns.index("lxid" if key == "lxid" else "mb")
+    i_ref, i_mb, i_ge, i_ps = (columns.index(col) for col in ("ref", "mb", "ge", "ps"))
+    counts, examples = Counter(), {}
+    for row in iter_tokens(tbpath):
+        if row[k] is None:
+            continue
+        analysis = (row[k], row[i_mb], row[i_ge], row[i_ps])
+        counts[analysis] += 1
+        refs = examples.setdefault(analysis, [])
+        # keep a few refs, each of them once
+        if len(refs) < n_examples and row[i_ref] not in refs:
+            refs.append(row[i_ref])
+    return counts, examples
+
+def count_corpus(files, key="lxid", workers=None):
+    """Count the analyses of all corpus files in parallel and add them up."""
+    counts, examples = Counter(), {}
+    with ProcessPoolExecutor(workers) as pool:
+        for fcounts, fexamples in pool.map(count_file, files, [key] * len(files)):
+            counts.update(fcounts)
+            for analysis, refs in fexamples.items():
+                known = examples.setdefault(analysis, [])
+                known.extend(refs[:n_examples - len(known)])
+    return counts, examples
+
+def inconsistent(counts, examples, key="lxid"):
+    """Return the items with more than one analysis as a replacement table.
+
+    The table has a row for every analysis except the most frequent one of
+    its item, which is the new value of the rows.
+
+    counts, examples: as returned by count_corpus
+    key (str): the name of the item column
+    """
+    import pandas as pd
+
+    # group the analyses by item
+    items = {}
+    for analysis, count in counts.items():
+        items.setdefault(analysis[0], []).append((count, analysis))
+
+    rows = []
+    for item in sorted(items):
+        analyses = items[item]
+        if len(analyses) < 2:
+            continue
+        # the most frequent analysis is proposed as the new one
+        analyses.sort(key=lambda a: (-a[0], [str(v) for v in a[1]]))
+        best = analyses[0][1]
+        for count, analysis in analyses[1:]:
+            rows.append((item, analysis[1], best[1], analysis[2], best[2], analysis[3], best[3],
+                         count, len(analyses), " ".join(examples.get(analysis, []))))
+    return pd.DataFrame(rows, columns=[key, "old_mb", "new_mb", "old_ge", "new_ge", "old_ps",
+                                       "new_ps", "count", "analyses", "examples"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report inconsistently annotated morphemes.")
+    parser.add_argument("output", nargs="?", default=wripath, help="the report (.xlsx or .csv)")
+    parser.add_argument("--key", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--workers", type=int, help="number of files to read in parallel")
+    args = parser.parse_args(argv)
+
+    files = toolbox_io.corpus_files(args.corpus)
+    counts, examples = count_corpus(files, args.key, args.workers)
+    report = inconsistent(counts, examples, args.key)
+
+    outdir = os.path.dirname(args.output)
+    if outdir and not os.path.exists(outdir):
+        os.makedirs(outdir)
+    if args.output.endswith(".csv"):
+        report.to_csv(args.output, index=False)
+    else:
+        report.to_excel(args.output, index=False)
+    print("{} files, {} morphemes, {} with more than one analysis, see {}".format(
+        len(files), len({a[0] for a in counts}), report[args.key].nunique(), args.output))
+
+if __name__ == "__main__":
+    main()
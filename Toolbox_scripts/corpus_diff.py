@@ -0,0 +1,135 @@
+"""
+Script compares two versions of corpus files, i.e. the originals and the
+output of a replacement run, and reports only the changes of the annotation,
+not of the spacing that realignment changes.
+
+The records of both versions are paired by their \\ref id and every tier is
+compared as its list of whitespace-separated tokens (morphemes on the morpheme
+tiers, words on \\tx). Tiers with the same tokens are skipped, for the others
+every changed token is written as a row (file, ref, tier, slot, item, old, new)
+to a CSV file, where slot is the position of the token on the tier and item
+the \\lxid (or \\mb) of the slot in the old version. The changes are also summed
+up per rule, (tier, old, new), in a second CSV file. Records that are only in
+one of the versions are reported as 'added' or 'removed'.
+
+Usage (from the Toolbox_scripts folder):
+    python corpus_diff.py Corpus_files/kha-Texts_test.txt Output_files/kha-Texts_test.txt
+    python corpus_diff.py Corpus_files/ Output_files/
+
+Assumptions:
+    - Two folders are compared file by file, pairing files by their name
+    - The reports are written to 'wripath' (corpus_diff.csv and
+    corpus_diff_summary.csv)
+    - Tokens are compared by position if a tier has the same number of tokens
+    in both versions, otherwise with difflib
+"""
+import os, sys, csv, argparse
+from collections import Counter
+from difflib import SequenceMatcher
+import toolbox_io
+
+# set the paths where files will be read/written
+wripath = "Output_files/"# path for the reports
+
+def record_tokens(path):
+    """Return the tokens of every tier of every utterance of a corpus file.
+
+    Returns a dict {(ref, occurrence): {tier: tuple of tokens}} in file order,
+    the occurrence tells apart records with the same \\ref id.
+
+    path (str): the corpus file
+    """
+    records, seen = {}, Counter()
+    with toolbox_io.open_corpus(path) as tfile:
+        for textid, ref in toolbox_io.iter_utterances(tfile):
+            refid = ref["\\ref"].strip()
+            seen[refid] += 1
+            records[(refid, seen[refid])] = {tier[1:]: tuple(value.split())
+                                              for tier, value in ref.items() if tier != "\\ref"}
+    return records
+
+def token_changes(old, new):
+    """Return the (slot, old token, new token) changes between two token lists."""
+    if len(old) == len(new):
+        return [(i, a, b) for i, (a, b) in enumerate(zip(old, new)) if a != b]
+    changes = []
+    for op, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if op == "equal":
+            continue
+        for k in range(max(i2 - i1, j2 - j1)):
+            changes.append((i1 + k, old[i1 + k] if i1 + k < i2 else "", new[j1 + k] if j1 + k < j2 else ""))
+    return changes
+
+def diff_files(oldpath, newpath, name=None):
+    """Compare two versions of a corpus file, returns the list of change rows.
+
+    oldpath, newpath (str): the old and new corpus file
+    name (str): the value of the 'file' column, defaults to the file name
+    """
+    name = name or os.path.basename(newpath)
+    old = record_tokens(oldpath)
+    rows = []
+    seen = set()
+    for key, tiers in record_tokens(newpath).items():
+        seen.add(key)
+        if key not in old:
+            rows.append((name, key[0], "", "", "", "", "added"))
+            continue
+        before = old[key]
+        for tier in list(before) + [t for t in tiers if t not in before]:
+            a, b = before.get(tier, ()), tiers.get(tier, ())
+            if a == b:
+                continue
+            items = before.get("lxid") or before.get("mb") or ()
+            for slot, x, y in token_changes(a, b):
+                item = items[slot] if tier in ("mb", "ph", "ge", "ps", "lxid") and slot < len(items) else ""
+                rows.append((name, key[0], tier, slot, item, x, y))
+    for key in old:
+        if key not in seen:
+            rows.append((name, key[0], "", "", "", "removed", ""))
+    return rows
+
+def summary(rows):
+    """Count the changes per rule, (tier, old, new), most frequent first."""
+    counts = Counter((row[2], row[5], row[6]) for row in rows if row[2])
+    return [rule + (count,) for rule, count in counts.most_common()]
+
+def pair_paths(old, new):
+    """Return the (old, new) pairs of corpus files to compare."""
+    if os.path.isdir(old) and os.path.isdir(new):
+        names = {os.path.basename(p): p for p in toolbox_io.corpus_files(new)}
+        return [(p, names[os.path.basename(p)]) for p in toolbox_io.corpus_files(old)
+                if os.path.basename(p) in names]
+    return [(old, new)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the annotation changes between two corpus versions.")
+    parser.add_argument("old", help="the old corpus file or folder")
+    parser.add_argument("new", help="the new corpus file or folder")
+    parser.add_argument("--output", default=wripath, help="folder for the reports")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for oldpath, newpath in pair_paths(args.old, args.new):
+        rows.extend(diff_files(oldpath, newpath))
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    with open(os.path.join(args.output, "corpus_diff.csv"), "w", encoding="utf-8", newline="") as dfile:
+        report = csv.writer(dfile)
+        report.writerow(["file", "ref", "tier", "slot", "item", "old", "new"])
+        report.writerows(rows)
+    rules = summary(rows)
+    with open(os.path.join(args.output, "corpus_diff_summary.csv"), "w", encoding="utf-8", newline="") as sfile:
+        report = csv.writer(sfile)
+        report.writerow(["tier", "old", "new", "count"])
+        report.writerows(rules)
+
+    for tier, old, new, count in rules[:20]:
+        print("\\{} '{}' -> '{}': {}".format(tier, old, new, count))
+    print("{} changes in {} utterances, {} rules, see {}".format(
+        len(rows), len({(r[0], r[1]) for r in rows}), len(rules), os.path.join(args.output, "corpus_diff.csv")))
+    return 1 if rows else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+A compact in-memory store of whole corpora, for analyses and batch
+replacements that need all corpus files at once.
+
+Instead of a dict of lists of strings per word (see toolbox_io.build_words),
+every tier value is replaced by an integer code from the vocabulary of its
+tier, so that each tag or gloss ('clitic=', 'pro', '3sg.M', ...) is stored only
+once, and the codes of all morphemes of the corpus are kept in one array per
+tier (array('I'), 4 bytes per morpheme). Offset arrays give the first morpheme
+of every word and the first word of every record:
+
+    store = CorpusStore.from_files(toolbox_io.corpus_files("Corpus_files/"))
+    store.build_words(0)                  # the words of record 0, as build_words returns them
+    store.counts("ps")                    # Counter of all \\ps tags
+    ps = store.array("ps")                # the \\ps codes as a NumPy array (no copy)
+    store.replace(compiled)               # compiled rules, see compile_rules.py
+    store.write_file(0, "Output_files/kha-Texts_test.txt")
+
+Records with alignment errors (see toolbox_io.check_words) and records
+without \\ref are kept as they are read, without words.
+
+Run the script to compare the memory used by the store with that of the
+words of build_words:
+    python corpus_store.py [Corpus_files/]
+"""
+import tracemalloc, argparse
+from array import array
+from collections import Counter, OrderedDict
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+
+class Vocabulary(object):
+    """The values of a tier and their codes, code 0 is the empty value."""
+
+    def __init__(self):
+        self.values = [""]
+        self.codes = {"": 0}
+
+    def code(self, value):
+        """Return the code of a value, adding it if it is new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+class CorpusStore(object):
+    """Corpus files with interned tier values in arrays."""
+
+    # the tiers stored per morpheme, \\tx is stored per word
+    tiers = ("mb", "ph", "ge", "ps", "lxid")
+
+    def __init__(self):
+        self.files = []
+        self.vocab = {tier: Vocabulary() for tier in ("tx",) + self.tiers}
+        # per morpheme: the code of every tier
+        self.morphemes = {tier: array("I") for tier in self.tiers}
+        # per word: the code of \tx and its first morpheme (one more for the end)
+        self.words = array("I")
+        self.word_starts = array("I", [0])
+        # per record: the file, its first word (one more for the end), the
+        # morpheme tiers it has, and its other tiers as (marker, value) tuples
+        self.record_files = array("I")
+        self.record_starts = array("I", [0])
+        self.record_tiers = []
+        self.record_other = []
+
+    def add_record(self, file_no, ref):
+        """Add a record, with its words if it is an utterance without errors."""
+        words, tiers = [], ()
+        if "\\ref" in ref:
+            words = toolbox_io.build_words(ref)
+            tiers = toolbox_io.utterance_tiers(ref)
+            if toolbox_io.check_words(ref, words, tiers):
+                words, tiers = [], ()
+        stored = set(tiers) | ({"\\tx"} if tiers else set())
+        self.record_tiers.append(tuple(tier[1:] for tier in tiers))
+        self.record_other.append(tuple((tier, value) for tier, value in ref.items() if tier not in stored))
+        self.record_files.append(file_no)
+        for word, morphemes in words:
+            self.words.append(self.vocab["tx"].code(word))
+            n_units = len(morphemes[tiers[0]])
+            for tier in self.tiers:
+                units = morphemes.get("\\" + tier)
+                codes = self.morphemes[tier]
+                vocab = self.vocab[tier]
+                if units is None:
+                    codes.extend([0] * n_units)
+                else:
+                    codes.extend(vocab.code(unit) for unit in units)
+            self.word_starts.append(self.word_starts[-1] + n_units)
+        self.record_starts.append(len(self.words))
+
+    def add_file(self, path):
+        """Add all records of a corpus file."""
+        file_no = len(self.files)
+        self.files.append(path)
+        with toolbox_io.open_corpus(path) as tfile:
+            for ref in toolbox_io.iter_records(tfile):
+                self.add_record(file_no, ref)
+
+    @classmethod
+    def from_files(cls, files):
+        """Build a store of corpus files."""
+        store = cls()
+        for path in files:
+            store.add_file(path)
+        return store
+
+    def __len__(self):
+        return len(self.record_files)
+
+    def build_words(self, record):
+        """Return the words of a record in the format of toolbox_io.build_words."""
+        words = []
+        for w in range(self.record_starts[record], self.record_starts[record + 1]):
+            start, end = self.word_starts[w], self.word_starts[w + 1]
+            morphemes = OrderedDict()
+            for tier in self.record_tiers[record]:
+                values = self.vocab[tier].values
+                morphemes["\\" + tier] = [values[c] for c in self.morphemes[tier][start:end]]
+            words.append((self.vocab["tx"][self.words[w]], morphemes))
+        return words
+
+    def record(self, record):
+        """Return a record as an ordered dict of its (not aligned) tiers."""
+        ref = OrderedDict(self.record_other[record])
+        words = self.build_words(record)
+        if words:
+            ref["\\tx"] = " ".join(word for word, morphemes in words)
+            for tier in self.record_tiers[record]:
+                ref["\\" + tier] = " ".join(" ".join(m["\\" + tier]) for w, m in words)
+        return ref
+
+    def counts(self, tier):
+        """Return a Counter of the values of a tier."""
+        values = self.vocab[tier].values
+        codes = self.words if tier == "tx" else self.morphemes[tier]
+        counts = Counter(codes)
+        counts.pop(0, None)
+        return Counter({values[code]: n for code, n in counts.items()})
+
+    def array(self, tier):
+        """Return the codes of a tier as a NumPy array that shares the memory of the store.
+
+        Records cannot be added to the store while the array is in use.
+        """
+        import numpy as np
+
+        return np.frombuffer(self.words if tier == "tx" else self.morphemes[tier], dtype=np.uint32)
+
+    def replace(self, compiled, lex="lxid"):
+        """Apply compiled replacement rules to all morphemes, returns the no. of changes.
+
+        compiled (dict): the rules {tier: {(item, old): new}}, see compile_rules.py
+        lex (str): 'lxid' to identify items by \\lxid, 'lx' by \\mb
+        """
+        import numpy as np
+
+        key = "lxid" if lex == "lxid" else "mb"
+        # a copy, so that the items are looked up before any tier is changed (\mb may be)
+        items = self.array(key).copy()
+        # the codes of every item, lxids are compared in lower case as in compile_rules.apply_rules
+        item_codes = {}
+        for value, code in self.vocab[key].codes.items():
+            item_codes.setdefault(value.lower() if lex == "lxid" else value, []).append(code)
+        changes = 0
+        for tier, rules in compiled.items():
+            if tier not in self.tiers:
+                continue
+            codes, vocab = self.array(tier), self.vocab[tier]
+            # every unit is looked up once, in its original value, so that the
+            # rules of a tier don't apply to the values of other rules (a -> b, b -> a)
+            updates = []
+            for (item, old), new in rules.items():
+                if item not in item_codes or old not in vocab.codes:
+                    continue
+                hits = np.isin(items, item_codes[item]) & (codes == vocab.codes[old])
+                if hits.any():
+                    updates.append((hits, new))
+            for hits, new in updates:
+                changes += int(hits.sum())
+                codes[hits] = vocab.code(new)
+        return changes
+
+    def write_file(self, file_no, outpath):
+        """Write the records of a file, realigning the utterances with words."""
+        with toolbox_io.open_output(outpath) as tbwrite:
+            for record in range(len(self)):
+                if self.record_files[record] != file_no:
+                    continue
+                words = self.build_words(record)
+                if words:
+                    toolbox_io.write_record(tbwrite, self.record(record), words,
+                                            tuple("\\" + t for t in self.record_tiers[record]))
+                else:
+                    toolbox_io.write_record(tbwrite, OrderedDict(self.record_other[record]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the memory of the corpus store with build_words.")
+    parser.add_argument("corpus", nargs="?", default=corpath, help="folder with the corpus files")
+    args = parser.parse_args(argv)
+    files = toolbox_io.corpus_files(args.corpus)
+
+    # read a file first, so that the imports of the reader are not counted
+    for path in files[:1]:
+        with toolbox_io.open_corpus(path) as tfile:
+            tfile.read()
+
+    # the records and their words, as the other scripts keep them
+    tracemalloc.start()
+    records = []
+    for path in files:
+        with toolbox_io.open_corpus(path) as tfile:
+            records.extend((ref, toolbox_io.build_words(ref)) for ref in toolbox_io.iter_records(tfile))
+    plain = tracemalloc.get_traced_memory()[0]
+    del records
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    store = CorpusStore.from_files(files)
+    compact = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("{} files, {} records, {} words, {} morphemes".format(
+        len(files), len(store), len(store.words), len(store.morphemes["mb"])))
+    for tier in store.vocab:
+        print("\t\\{}: {} distinct values".format(tier, len(store.vocab[tier]) - 1))
+    print("records with build_words: {:.1f} MB, store: {:.1f} MB".format(plain / 1e6, compact / 1e6))
+
+if __name__ == "__main__":
+    main()
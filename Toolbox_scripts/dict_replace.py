@@ -1,10 +1,13 @@
 # Script for replacing items in a Toolbox dictionary based on a spreadsheet
 # of lexical items and replacement forms.
 # Python 3
-import os
-import pandas as pd
-import numpy as np
-from collections import OrderedDict, defaultdict
+#
+# Run without arguments to use the files and columns set below, or pass
+# them on the command line (--dict, --table, --output, --markers, --columns),
+# as for dict_replace_new.py. With --yes the script does not wait for the
+# field markers to be checked, but writes them to a report (--report).
+import os, argparse
+from dict_replace_new import check_markers, write_report, load_markers
 
 """
 A function that checks whether the items should be replaced.
@@ -45,28 +48,15 @@ def write_entry(filewrite, headword, pre, entry, ln, temptext):
 
 # path to store auto-generated spreadsheets
 path = "Output_files/"
-if not os.path.exists(path):
-    os.makedirs(path)
 # path for dictionaries
 dpath = "Dictionaries/"
 # the location/name of the replacement table file
 repfile = dpath+'kha-replacetable.xlsx'
 # the location/name of the Toolbox dictionary file to be replaced
 dfile = dpath+'kha-Dictionary.txt'
-# open the Toolbox dictionary
-tbfile = open(dfile, 'r')
-# store the name of the file
-workfile = dfile[len(dpath):-4]
-# create a new text file to write the new entries in the toolbox format, using
-# the Toolbox dictionary filename as a basis for the new file
-newfile = workfile+"_NEW.txt"
-filewrite = open(path+newfile, "w")#, encoding='utf-8')
-# open the excel spreadsheet file
-reader = pd.read_excel(repfile)
-reader = reader[['lx', 'Old pos', 'New pos']]# these are the column headers with lexeme and replacement information
-# convert the spreadsheet file to a python dictionary ordered by row number
-readict = reader.to_dict()
-reprange = list(range(len(reader)))
+# these are the column headers with lexeme and replacement information, and the
+# marker (without backslash) of the tier to replace
+columns = ['lx', 'ps', 'Old pos', 'New pos']
 
 # below are Toolbox codes for the lines, edit for different dictionary formats
 idtext = "\\_sh v3.0  231  MDF 4.0" # this is the header for Toolbox dictionaries
@@ -74,52 +64,103 @@ temptext = "\n" # use this variable as a placeholder
 # these are the field markers in a given Toolbox dictionary entry
 markers = {'lx': "\\lx ", 'alt': "\\a ", 'hm': "\\hm ", 'ph': "\\ph ", 'ps': "\\ps ",
             'ge': "\\ge ", 'nt': "\\nt ", 'dt': "\\dt "}
-# print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
-with open(dfile, 'r') as tbtemp:
-    markerlist = []
-    for lt in tbtemp:
-        if lt.startswith("\\"):
-            tpline = lt.split()[0]
-            if tpline not in markerlist:
-                markerlist.append(tpline)
-    print(markerlist)
-    tbtemp.close()
-input("Check field markers and press any key to continue")
 
-entry = {}# the dict for storing entries
-headword = ''# the headword for the entry
-current = ''# the current marker in the entry
-filewrite.write(idtext+temptext+temptext)# write the header to the new file
-# go through each line in the dictionary file
-for line in tbfile:
-    for k, v in markers.items():
-        # check if the line starts with one of the markers
-        if line.startswith(v):
-            current = k# make the marker the current entry
-            # if the current marker is the lexical entry
-            if k == 'lx':
-                # if the previous entry is not blank
-                if headword != "":
-                    # run the function to replace the element from the replacement table
-                    check_replace(entry, headword, readict, reprange, 'lx', 'ps', 'Old pos', 'New pos')
-                    # then write the new entry to the new file
-                    for key, val in markers.items():
-                        write_entry(filewrite, headword, val, entry, key, temptext)
-                    filewrite.write(temptext)
-                # reset the entry dict with the current lexical item as headword/key
-                entry = {}
-                headword = line[len(v):].rstrip()# get the line
-                entry[headword] = {k: headword}# build a mini-dict
-            # if the current marker is not the lexeme but one of the others
-            else:
-                # get the entry
-                tword = line[len(v):].rstrip()
-                # add it to the dict or append to existing dict entry
-                if k in entry[headword].keys():
-                    entry[headword][k] += "\n"+v+tword
+"""
+A function that replaces items in a Toolbox dictionary and writes the new one.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'repfile': the replacement table
+    'newpath': the new Toolbox dictionary
+    'markers': the field markers of the dictionary
+    'columns': the replacement table column of the lexeme, the marker to
+    replace, and the columns of old and new values
+"""
+def replace_dictionary(dfile, repfile, newpath, markers=markers, columns=columns):
+    import pandas as pd
+
+    lx, ps, old, new = columns
+    # open the Toolbox dictionary
+    tbfile = open(dfile, 'r')
+    filewrite = open(newpath, "w")#, encoding='utf-8')
+    # open the excel spreadsheet file
+    reader = pd.read_excel(repfile)
+    reader = reader[[lx, old, new]]# these are the column headers with lexeme and replacement information
+    # convert the spreadsheet file to a python dictionary ordered by row number
+    readict = reader.to_dict()
+    reprange = list(range(len(reader)))
+
+    entry = {}# the dict for storing entries
+    headword = ''# the headword for the entry
+    current = ''# the current marker in the entry
+    filewrite.write(idtext+temptext+temptext)# write the header to the new file
+    # go through each line in the dictionary file
+    for line in tbfile:
+        for k, v in markers.items():
+            # check if the line starts with one of the markers
+            if line.startswith(v):
+                current = k# make the marker the current entry
+                # if the current marker is the lexical entry
+                if k == 'lx':
+                    # if the previous entry is not blank
+                    if headword != "":
+                        # run the function to replace the element from the replacement table
+                        check_replace(entry, headword, readict, reprange, lx, ps, old, new)
+                        # then write the new entry to the new file
+                        for key, val in markers.items():
+                            write_entry(filewrite, headword, val, entry, key, temptext)
+                        filewrite.write(temptext)
+                    # reset the entry dict with the current lexical item as headword/key
+                    entry = {}
+                    headword = line[len(v):].rstrip()# get the line
+                    entry[headword] = {k: headword}# build a mini-dict
+                # if the current marker is not the lexeme but one of the others
                 else:
-                    entry[headword][k] = tword
+                    # get the entry
+                    tword = line[len(v):].rstrip()
+                    # add it to the dict or append to existing dict entry
+                    if k in entry[headword].keys():
+                        entry[headword][k] += "\n"+v+tword
+                    else:
+                        entry[headword][k] = tword
+
+    # write the last entry of the dictionary
+    for k, v in markers.items():
+        write_entry(filewrite, headword, v, entry, k, temptext)
+    tbfile.close()
+    filewrite.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replace items in a Toolbox dictionary.")
+    parser.add_argument("--dict", default=dfile, help="the Toolbox dictionary")
+    parser.add_argument("--table", default=repfile, help="the replacement table")
+    parser.add_argument("--output", help="the new dictionary (default Output_files/<dictionary>_NEW.txt)")
+    parser.add_argument("--markers", type=load_markers, default=markers,
+                        help="JSON object (or file) mapping marker names to markers")
+    parser.add_argument("--columns", nargs=4, default=columns, metavar=("LX", "TIER", "OLD", "NEW"),
+                        help="lexeme column, marker to replace, old and new value columns")
+    parser.add_argument("--yes", action="store_true",
+                        help="don't wait for the markers to be checked, write them to a report")
+    parser.add_argument("--report", help="the markers report of --yes (default Output_files/<dictionary>_markers.txt)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    # store the name of the file
+    workfile = os.path.basename(args.dict)[:-4]
+    # create a new text file to write the new entries in the toolbox format, using
+    # the Toolbox dictionary filename as a basis for the new file
+    newpath = args.output or path+workfile+"_NEW.txt"
+
+    # print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
+    markerlist, missing = check_markers(args.dict, args.markers)
+    if args.yes:
+        write_report(args.report or path+workfile+"_markers.txt", args.dict, markerlist, missing)
+    else:
+        print(markerlist)
+        input("Check field markers and press any key to continue")
+
+    replace_dictionary(args.dict, args.table, newpath, args.markers, args.columns)
+    return [newpath]
 
-# write the last entry of the dictionary
-for k, v in markers.items():
-    write_entry(filewrite, headword, v, entry, k, temptext)
+if __name__ == "__main__":
+    main()
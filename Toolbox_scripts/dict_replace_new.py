@@ -1,10 +1,21 @@
 # Script for replacing items in a Toolbox dictionary based on a spreadsheet
 # of lexical items and replacement forms.
 # Python 3
-import os
-import pandas as pd
-import numpy as np
-from collections import OrderedDict, defaultdict
+#
+# Run without arguments to use the files and columns set below, or pass
+# them on the command line, i.e.:
+#   python dict_replace_new.py --dict Dictionaries/kha-Dictionary.txt
+#       --table Dictionaries/kha-replacetable.xlsx --columns lxid ge old_ge new_ge
+# With --yes the script does not wait for the field markers to be checked,
+# but writes markers that would be dropped to Output_files/<dictionary>_markers.txt
+# (or --report).
+# With --patch only the changed lines are rewritten and the rest of the
+# dictionary is copied as it is, so no markers are dropped.
+# To run many dictionaries at once, see batch_dictionaries.py.
+import os, json, shutil, argparse
+from collections import defaultdict
+import toolbox_io
+from lexicon import named_fields
 
 """
 A function that checks whether the items should be replaced.
@@ -18,21 +29,21 @@ A function that checks whether the items should be replaced.
     'old': the column heading in the replacement spreadsheet that identifies the old term
     'new': the column heading in the replacement spreadsheet that identifies the old term
 
-Possibly required adjustments:
-    - line 81: adjust according to format of Dictionary.txt file
-    - line 59, 61: adjust names of files to use
-    - line 72, 111: adjust according to column names in replacement table
+Possibly required adjustments (or pass them on the command line):
+    - 'markers': adjust according to format of Dictionary.txt file
+    - 'repfile', 'dfile': adjust names of files to use
+    - 'columns': adjust according to column names in replacement table
 
 """
 def check_replace(entry, headword, readict, reprange, lx, ps, old, new):
     for num in reprange:
-        if headword == readict[lx][num]:
-            if entry[headword][ps] == readict[old][num]:
+        if entry[headword].get(lx, headword).strip() == readict[lx][num]:
+            if entry[headword].get(ps, "").strip() == readict[old][num]:
                 entry[headword][ps] = readict[new][num]
         else:
             pass
 
-    return entry[headword][ps]
+    return entry[headword].get(ps)
 
 """
 A function that writes each entry's item to a file.
@@ -51,28 +62,15 @@ def write_entry(filewrite, headword, pre, entry, ln, temptext):
 
 # path to store auto-generated spreadsheets
 path = "Output_files/"
-if not os.path.exists(path):
-    os.makedirs(path)
 # path for dictionaries
 dpath = "Dictionaries/"
 # the location/name of the replacement table file
 repfile = dpath+'kha-replacetable.xlsx'
 # the location/name of the Toolbox dictionary file to be replaced
 dfile = dpath+'kha-Dictionary.txt'
-# open the Toolbox dictionary
-tbfile = open(dfile, 'r')
-# store the name of the file
-workfile = dfile[len(dpath):-4]
-# create a new text file to write the new entries in the toolbox format, using
-# the Toolbox dictionary filename as a basis for the new file
-newfile = workfile+"_NEW.txt"
-filewrite = open(path+newfile, "w")#, encoding='utf-8')
-# open the excel spreadsheet file
-reader = pd.read_excel(repfile)
-reader = reader[['lx', 'old_ps', 'new_ps']]# these are the column headers with lexeme and replacement information
-# convert the spreadsheet file to a python dictionary ordered by row number
-readict = reader.to_dict()
-reprange = list(range(len(reader)))
+# these are the column headers with lexeme and replacement information, and the
+# marker (without backslash) of the tier to replace
+columns = ['lx', 'ps', 'old_ps', 'new_ps']
 
 # below are Toolbox codes for the lines, edit for different dictionary formats
 idtext = "\\_sh v3.0  231  MDF 4.0" # this is the header for Toolbox dictionaries
@@ -81,52 +79,245 @@ temptext = "\n" # use this variable as a placeholder
 markers = {'lx': "\\lx ", 'va': "\\va ", 'ps': "\\ps ", 'ge': "\\ge ",
             'lxid': "\\lxid", 'de': "\\de", 'mya': "\\mya", 'nt': "\\nt ",
             'dt': "\\dt "}
-# print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
-with open(dfile, 'r') as tbtemp:
-    markerlist = []
-    for lt in tbtemp:
-        if lt.startswith("\\"):
-            tpline = lt.split()[0]
-            if tpline not in markerlist:
-                markerlist.append(tpline)
-    print(markerlist)
-    tbtemp.close()
-input("Check field markers and press any key to continue")
-
-entry = {}# the dict for storing entries
-headword = ''# the headword for the entry
-current = ''# the current marker in the entry
-filewrite.write(idtext+temptext+temptext)# write the header to the new file
-# go through each line in the dictionary file
-for line in tbfile:
-    for k, v in markers.items():
-        # check if the line starts with one of the markers
-        if line.startswith(v):
-            current = k# make the marker the current entry
-            # if the current marker is the lexical entry
-            if k == 'lx':
-                # if the previous entry is not blank
-                if headword != "":
-                    # run the function to replace the element from the replacement table
-                    check_replace(entry, headword, readict, reprange, 'lx', 'ps', 'old_ps', 'new_ps')
-                    # then write the new entry to the new file
-                    for key, val in markers.items():
-                        write_entry(filewrite, headword, val, entry, key, temptext)
-                    filewrite.write(temptext)
-                # reset the entry dict with the current lexical item as headword/key
-                entry = {}
-                headword = line[len(v):].rstrip()# get the line
-                entry[headword] = {k: headword}# build a mini-dict
-            # if the current marker is not the lexeme but one of the others
-            else:
-                # get the entry
-                tword = line[len(v):].rstrip()
-                # add it to the dict or append to existing dict entry
-                if k in entry[headword].keys():
-                    entry[headword][k] += "\n"+v+tword
-                else:
-                    entry[headword][k] = tword
-
-# write the last entry of the dictionary
-for k, v in markers.items():
-    write_entry(filewrite, headword, v, entry, k, temptext)
+
+"""
+A function that lists the field markers of a Toolbox dictionary.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'markers': the field markers the script reads
+  Returns the markers in the dictionary and those not covered by 'markers',
+  which would be dropped from the new dictionary.
+"""
+def check_markers(dfile, markers):
+    with open(dfile, 'r') as tbtemp:
+        markerlist = []
+        for lt in tbtemp:
+            if lt.startswith("\\"):
+                tpline = lt.split()[0]
+                if tpline not in markerlist:
+                    markerlist.append(tpline)
+    known = [v.strip() for v in markers.values()]
+    missing = [m for m in markerlist if m not in known and m != "\\_sh"]
+    return markerlist, missing
+
+"""
+A function that writes the result of check_markers to a report file.
+  Arguments are:
+    'report': the report file
+    'dfile': the Toolbox dictionary
+    'markerlist', 'missing': the result of check_markers
+"""
+def write_report(report, dfile, markerlist, missing):
+    # a new report on every run, so that it only describes the last one
+    with open(report, 'w', encoding='utf-8') as rfile:
+        rfile.write(dfile+temptext)
+        rfile.write("  markers: "+" ".join(markerlist)+temptext)
+        if missing:
+            rfile.write("  not in markers, dropped from output: "+" ".join(missing)+temptext)
+        else:
+            rfile.write("  all markers are written"+temptext)
+
+"""
+A function that replaces items in a Toolbox dictionary and writes the new one.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'repfile': the replacement table
+    'newpath': the new Toolbox dictionary
+    'markers': the field markers of the dictionary
+    'columns': the replacement table column of the lexeme, the marker to
+    replace, and the columns of old and new values
+"""
+def replace_dictionary(dfile, repfile, newpath, markers=markers, columns=columns):
+    import pandas as pd
+
+    lx, ps, old, new = columns
+    # open the excel spreadsheet file
+    reader = pd.read_excel(repfile)
+    reader = reader[[lx, old, new]]
+    if lx == 'lxid':
+        reader[lx] = reader[lx].astype(str).apply(lambda x: x.zfill(4))
+    # convert the spreadsheet file to a python dictionary ordered by row number
+    readict = reader.to_dict()
+    reprange = list(range(len(reader)))
+
+    # open the Toolbox dictionary and the new file
+    with toolbox_io.open_corpus(dfile) as tbfile, open(newpath, "w") as filewrite:
+        filewrite.write(idtext+temptext+temptext)# write the header to the new file
+        # go through each entry in the dictionary file
+        for num, fields in enumerate(toolbox_io.iter_entries(tbfile)):
+            # the entry's markers by name, with the lexical item as headword/key
+            fields = named_fields(fields, markers)
+            headword = fields['lx']
+            entry = {headword: fields}
+            # a blank line between the entries
+            if num:
+                filewrite.write(temptext)
+            # run the function to replace the element from the replacement table
+            check_replace(entry, headword, readict, reprange, lx, ps, old, new)
+            # then write the new entry to the new file
+            for k, v in markers.items():
+                write_entry(filewrite, headword, v, entry, k, temptext)
+
+"""
+A function that finds the field lines a replacement table changes in a Toolbox
+dictionary, reading it as bytes so that the offsets are exact.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'repfile': the replacement table
+    'columns': the replacement table column of the lexeme, the marker to
+    replace, and the columns of old and new values
+  Returns a list of (start, end, new line) byte spans, in file order. Every
+  line of the marker in an entry is checked (i.e. the \\ps of each sense), a
+  field continued on the next lines is compared and replaced as a whole, and
+  the rows of the table are applied in order, as in check_replace.
+"""
+def find_patches(dfile, repfile, columns=columns):
+    import pandas as pd
+
+    lx, ps, old, new = columns
+    reader = pd.read_excel(repfile, dtype=str)
+    # rows without a new value are not filled in yet, they don't blank the field
+    reader = reader[[lx, old, new]].dropna()
+    for col in (lx, old, new):
+        reader[col] = reader[col].str.strip()
+    if lx == 'lxid':
+        reader[lx] = reader[lx].str.zfill(4)
+    # the (old, new) values of every lexeme, in row order
+    rows = defaultdict(list)
+    for item, before, after in reader.itertuples(index=False):
+        rows[item].append((before, after))
+    lxmarker, psmarker = ("\\"+lx).encode(), ("\\"+ps).encode()
+
+    patches = []
+    fields = []# the (start, end, lines) of the marker's fields in the current entry
+    item = None# the lexeme of the current entry
+    current = None# the marker of the current line
+    def close_entry():
+        for start, end, lines in fields:
+            value = " ".join(l.decode('utf-8').strip() for l in lines)[len(ps)+1:].strip()
+            result = value
+            for before, after in rows.get(item, []):
+                if result == before:
+                    result = after
+            if result != value:
+                # keep the marker, the spacing after it and the line ending of the field
+                first, last = lines[0], lines[-1]
+                gap = len(psmarker) + len(first[len(psmarker):]) - len(first[len(psmarker):].lstrip(b" \t"))
+                eol = last[len(last.rstrip(b"\r\n")):]
+                patches.append((start, end, first[:gap] + result.encode('utf-8') + eol))
+
+    offset = 0
+    with open(dfile, 'rb') as tbfile:
+        for line in tbfile:
+            if line.startswith(b"\\"):
+                current = line.split(None, 1)[0]
+                if current == b"\\lx":
+                    close_entry()
+                    fields, item = [], None
+                if current == lxmarker:
+                    item = line[len(lxmarker):].decode('utf-8').strip()
+                    if lx == 'lxid':
+                        item = item.zfill(4)
+                if current == psmarker:
+                    fields.append([offset, offset+len(line), [line]])
+            elif current == psmarker and line.strip() and fields:
+                # a continuation line of the field
+                fields[-1][1] = offset+len(line)
+                fields[-1][2].append(line)
+            offset += len(line)
+        close_entry()
+    return patches
+
+"""
+A function that writes a copy of a Toolbox dictionary with some byte spans
+replaced, copying the unchanged parts in blocks.
+  Arguments are:
+    'dfile': the Toolbox dictionary
+    'newpath': the new Toolbox dictionary
+    'patches': the (start, end, new line) spans from find_patches
+"""
+def apply_patches(dfile, newpath, patches, blocksize=1024*1024):
+    with open(dfile, 'rb') as src, open(newpath, 'wb') as dst:
+        pos = 0
+        for start, end, data in patches:
+            # copy everything up to the patched line unchanged
+            remaining = start - pos
+            while remaining > 0:
+                block = src.read(min(blocksize, remaining))
+                dst.write(block)
+                remaining -= len(block)
+            dst.write(data)
+            src.seek(end)
+            pos = end
+        shutil.copyfileobj(src, dst, blocksize)
+
+"""
+A function that replaces items in a Toolbox dictionary by patching only the
+lines that change, so that every other byte of the dictionary (markers not in
+'markers', spacing, line endings, the header) is kept.
+  Arguments are:
+    'dfile', 'repfile', 'newpath', 'columns': as in replace_dictionary
+  Returns the number of lines that were changed.
+"""
+def patch_dictionary(dfile, repfile, newpath, columns=columns):
+    patches = find_patches(dfile, repfile, columns)
+    apply_patches(dfile, newpath, patches)
+    return len(patches)
+
+"""
+A function that turns a markers argument into a markers dict.
+  Arguments are:
+    'value': a JSON object like {"lx": "\\lx ", "ps": "\\ps "}, or the path to
+    a file containing one
+"""
+def load_markers(value):
+    if os.path.exists(value):
+        with open(value, 'r', encoding='utf-8') as mfile:
+            return json.load(mfile)
+    return json.loads(value)
+
+def parse_args(argv=None, markers=markers, columns=columns):
+    parser = argparse.ArgumentParser(description="Replace items in a Toolbox dictionary.")
+    parser.add_argument("--dict", default=dfile, help="the Toolbox dictionary")
+    parser.add_argument("--table", default=repfile, help="the replacement table")
+    parser.add_argument("--output", help="the new dictionary (default Output_files/<dictionary>_NEW.txt)")
+    parser.add_argument("--markers", type=load_markers, default=markers,
+                        help="JSON object (or file) mapping marker names to markers")
+    parser.add_argument("--columns", nargs=4, default=columns, metavar=("LX", "TIER", "OLD", "NEW"),
+                        help="lexeme column, marker to replace, old and new value columns")
+    parser.add_argument("--yes", action="store_true",
+                        help="don't wait for the markers to be checked, write them to a report")
+    parser.add_argument("--report", help="the markers report of --yes (default Output_files/<dictionary>_markers.txt)")
+    parser.add_argument("--patch", action="store_true",
+                        help="only rewrite the changed lines, keeping all other markers and formatting")
+    return parser.parse_args(argv)
+
+def main(argv=None, markers=markers, columns=columns):
+    args = parse_args(argv, markers, columns)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    # store the name of the file
+    workfile = os.path.basename(args.dict)[:-4]
+    # create a new text file to write the new entries in the toolbox format, using
+    # the Toolbox dictionary filename as a basis for the new file
+    newpath = args.output or path+workfile+"_NEW.txt"
+
+    # in patch mode nothing is dropped, so the markers don't need to be checked
+    if args.patch:
+        changed = patch_dictionary(args.dict, args.table, newpath, args.columns)
+        print("{}: {} lines changed".format(newpath, changed))
+        return [newpath]
+
+    # print out the markers in the original Toolbox dictionary file to ensure that it has the same markers
+    markerlist, missing = check_markers(args.dict, args.markers)
+    if args.yes:
+        write_report(args.report or path+workfile+"_markers.txt", args.dict, markerlist, missing)
+    else:
+        print(markerlist)
+        input("Check field markers and press any key to continue")
+
+    replace_dictionary(args.dict, args.table, newpath, args.markers, args.columns)
+    return [newpath]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Script compares two versions of a Toolbox (MDF) dictionary and writes the
+replacement table that updates the corpus to the new version, so it does not
+have to be built by hand after the dictionary was edited.
+
+Entries are matched on their \\lxid, or on \\lx and \\hm if the dictionaries
+have no \\lxid. For every matched entry where \\ps, \\ge or \\lx changed, a row is
+written with the columns lxid, old_ps/new_ps, old_ge/new_ge and old_mb/new_mb
+(the \\lx of the dictionary is the \\mb of the corpus), which is the format
+get_repdict in the replace_Toolbox_xx.py scripts expects. Columns of tiers that
+did not change in an entry are left empty.
+
+Usage (from the Toolbox_scripts folder):
+    python diff_dictionaries.py old/kha-Dictionary.txt Dictionaries/kha-Dictionary.txt
+
+Assumptions:
+    - The table is written to 'wripath'/<iso>-replacetable_diff.xlsx, and with
+    --split also one table per tier (<iso>-replacetable_diff_ps.xlsx, ...),
+    since the replacement scripts work best with one table per tier
+    - Entries that were added or removed, or whose key is not unique, are only
+    listed in 'wripath'/<iso>-replacetable_diff.txt
+    - Only the first \\ps and \\ge of an entry are compared
+"""
+import os, argparse
+from collections import OrderedDict
+import toolbox_io
+from lexicon import Lexicon
+
+# set the paths where files will be read/written
+wripath = "Output_files/"# path for the replacement table
+
+# the replacement table tiers and the dictionary markers they come from
+tiers = OrderedDict([("ps", "\\ps"), ("ge", "\\ge"), ("mb", "\\lx")])
+
+def has_lxids(dfile):
+    """Check whether a dictionary has an \\lxid field."""
+    with toolbox_io.open_corpus(dfile) as tbfile:
+        return any(line.startswith("\\lxid ") for line in tbfile)
+
+def entry_key(fields, key):
+    """Return the key of an entry, the \\lxid or the (\\lx, \\hm) pair."""
+    if key == "lxid":
+        lxid = fields.get("\\lxid", "").strip()
+        return lxid.zfill(4) if lxid else None
+    return (fields["\\lx"].strip(), fields.get("\\hm", "").strip())
+
+def index_entries(dfile, key):
+    """Hash the entries of a dictionary by their key.
+
+    Returns a dict {key: fields} and the list of keys that are not unique.
+
+    dfile (str): the Toolbox dictionary
+    key (str): 'lxid' or 'lx'
+    """
+    # the old version is only read once, so it is parsed without a snapshot
+    lexicon = Lexicon.from_file(dfile)
+    keys = lexicon.lxid if key == "lxid" else lexicon.lx_hm
+    index = {k: lexicon.fields(num) for k, num in keys.items()}
+    duplicates = [k for k in lexicon.duplicates if isinstance(k, tuple) == (key == "lx")]
+    return index, duplicates
+
+def diff(oldfile, newfile, key):
+    """Compare two dictionaries, returns the changed rows and the report lines.
+
+    The old dictionary is hashed by key, the new one is streamed and joined to it.
+
+    oldfile, newfile (str): the old and new Toolbox dictionaries
+    key (str): 'lxid' or 'lx'
+    """
+    old, duplicates = index_entries(oldfile, key)
+    report = ["duplicate key in {}: {}".format(oldfile, k) for k in duplicates]
+    rows, seen = [], set()
+    with toolbox_io.open_corpus(newfile) as tbfile:
+        for entry in toolbox_io.iter_entries(tbfile):
+            fields = toolbox_io.entry_fields(entry)
+            k = entry_key(fields, key)
+            if k is None:
+                continue
+            if k in seen:
+                report.append("duplicate key in {}: {}".format(newfile, k))
+                continue
+            seen.add(k)
+            if k not in old:
+                report.append("added: {}".format(k))
+                continue
+
+            row = list(k) if key == "lx" else [k]
+            changed = False
+            for tier, marker in tiers.items():
+                before = old[k].get(marker, "").strip()
+                after = fields.get(marker, "").strip()
+                if before != after:
+                    row += [before, after]
+                    changed = True
+                else:
+                    row += [None, None]
+            if changed:
+                rows.append(row)
+    report += ["removed: {}".format(k) for k in old if k not in seen]
+    return rows, report
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Build a replacement table from two dictionary versions.")
+    parser.add_argument("old", help="the old Toolbox dictionary")
+    parser.add_argument("new", help="the new Toolbox dictionary")
+    parser.add_argument("--key", choices=("lxid", "lx"),
+                        help="match entries on \\lxid or on \\lx and \\hm (default: lxid if present)")
+    parser.add_argument("--split", action="store_true", help="also write one table per tier")
+    parser.add_argument("--output", default=wripath, help="folder for the replacement tables")
+    args = parser.parse_args(argv)
+
+    key = args.key or ("lxid" if has_lxids(args.old) and has_lxids(args.new) else "lx")
+    rows, report = diff(args.old, args.new, key)
+
+    keycols = ["lx", "hm"] if key == "lx" else ["lxid"]
+    cols = keycols + [prefix + tier for tier in tiers for prefix in ("old_", "new_")]
+    table = pd.DataFrame(rows, columns=cols)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    base = os.path.join(args.output, toolbox_io.file_iso(args.new) + "-replacetable_diff")
+    table.to_excel(base + ".xlsx", index=False)
+    written = [base + ".xlsx"]
+    if args.split:
+        for tier in tiers:
+            part = table.dropna(subset=["old_" + tier, "new_" + tier], how="all")
+            part[keycols + ["old_" + tier, "new_" + tier]].to_excel(base + "_" + tier + ".xlsx", index=False)
+            written.append(base + "_" + tier + ".xlsx")
+    with open(base + ".txt", "w", encoding="utf-8") as rfile:
+        for line in report:
+            rfile.write(line + "\n")
+
+    print("{} entries changed (matched on {}), {} other differences, see {}.txt".format(
+        len(table), key, len(report), base))
+    for path in written:
+        print(path)
+
+if __name__ == "__main__":
+    main()
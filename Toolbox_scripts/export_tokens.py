@@ -0,0 +1,125 @@
+"""
+Script exports Toolbox corpus files to a long-format token table, with one row
+per morpheme slot, saved as Parquet or Feather. Counts, cross-tabs and lookups
+can then be done with pandas or pyarrow without parsing the corpus again, i.e.:
+
+    tokens = pd.read_parquet("Output_files/corpus_tokens.parquet")
+    pd.crosstab(tokens["mb"], tokens["ps"])
+
+Usage (from the Toolbox_scripts folder):
+    python export_tokens.py [Output_files/corpus_tokens.parquet|.feather]
+
+Columns:
+    file, id (\\id), ref (\\ref), utterance (no. of the utterance in the file),
+    begin/end (\\ELANBegin/\\ELANEnd in seconds), participant (\\ELANParticipant),
+    word (word index), morpheme (morpheme index), and one column per tier:
+    tx (the word the morpheme belongs to), mb, ph, ge, ps, lxid
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder
+    - pyarrow is installed; the table is written one corpus file at a time
+"""
+import os, argparse
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+wripath = "Output_files/corpus_tokens.parquet"# path for the token table
+
+# the morpheme tiers, which become columns of the same name
+tiers = ("mb", "ph", "ge", "ps", "lxid")
+# the columns of the token table, in order
+columns = ("file", "id", "ref", "utterance", "begin", "end", "participant",
+           "word", "morpheme", "tx") + tiers
+
+def get_time(ref, tier):
+    """Return the time of an ELAN tier in seconds, or None."""
+    try:
+        return float(ref[tier].strip())
+    except (KeyError, ValueError):
+        return None
+
+def iter_tokens(tbpath, name=None):
+    """Iterate and yield a tuple of column values for every morpheme slot of a
+    corpus file, in the order of 'columns'.
+
+    tbpath (str): the corpus file
+    name (str): the value of the 'file' column, defaults to the file name
+    """
+    name = name or os.path.basename(tbpath)
+    with toolbox_io.open_corpus(tbpath) as tfile:
+        for utterance, (textid, ref) in enumerate(toolbox_io.iter_utterances(tfile)):
+            head = (name, textid, ref["\\ref"].strip(), utterance,
+                    get_time(ref, "\\ELANBegin"), get_time(ref, "\\ELANEnd"),
+                    ref.get("\\ELANParticipant", "").strip() or None)
+            for w, (word, morphemes) in enumerate(toolbox_io.build_words(ref)):
+                # take the longest morpheme tier as the number of slots
+                n_units = max([len(m) for m in morphemes.values()] or [0])
+                for m in range(n_units):
+                    values = []
+                    for tier in tiers:
+                        units = morphemes.get("\\" + tier, [])
+                        values.append(units[m] if m < len(units) else None)
+                    yield head + (w, m, word) + tuple(values)
+
+def schema():
+    """Return the pyarrow schema of the token table."""
+    import pyarrow as pa
+
+    types = {"utterance": pa.int32(), "word": pa.int32(), "morpheme": pa.int32(),
+             "begin": pa.float64(), "end": pa.float64()}
+    return pa.schema([(col, types.get(col, pa.string())) for col in columns])
+
+def file_table(tbpath):
+    """Return the tokens of a corpus file as a pyarrow table."""
+    import pyarrow as pa
+
+    rows = list(iter_tokens(tbpath))
+    return pa.Table.from_pydict({col: [row[i] for row in rows] for i, col in enumerate(columns)},
+                                schema=schema())
+
+def export(files, outpath):
+    """Write the tokens of all files to a Parquet or Feather file, one corpus
+    file at a time.
+
+    files (list): the corpus files
+    outpath (str): the output file, ending in .parquet or .feather
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    outdir = os.path.dirname(outpath)
+    if outdir and not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    if outpath.endswith(".feather"):
+        # feather (v2) is the arrow IPC file format, which can be written in batches
+        writer = pa.ipc.new_file(outpath, schema())
+        write = writer.write_table
+    else:
+        writer = pq.ParquetWriter(outpath, schema())
+        write = writer.write_table
+
+    n_tokens = 0
+    try:
+        for tbpath in files:
+            table = file_table(tbpath)
+            write(table)
+            n_tokens += table.num_rows
+            print("{}: {} tokens".format(tbpath, table.num_rows))
+    finally:
+        writer.close()
+    return n_tokens
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Toolbox corpus files to a token table.")
+    parser.add_argument("output", nargs="?", default=wripath,
+                        help="the token table, ending in .parquet or .feather")
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    args = parser.parse_args(argv)
+
+    n_tokens = export(toolbox_io.corpus_files(args.corpus), args.output)
+    print("{} tokens written to {}".format(n_tokens, args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Script compiles replacement tables into a frozen rules file: a read-only
+binary file that is opened with mmap and searched where it lies, so that the
+rules do not have to be read from Excel, compiled and kept in the memory of
+every process that uses them. Any number of jobs (toolbox_filter.py in a
+pipeline, the workers of a batch run, ...) share the one copy the system
+keeps of the file, and opening it takes no time whatever the number of rules.
+
+    python frozen_rules.py Dictionaries/kha-pos.xlsx Dictionaries/kha-gloss.xlsx
+    python toolbox_filter.py Output_files/kha-rules.frozen < kha-text.txt > new.txt
+
+    rules = FrozenRules("Output_files/kha-rules.frozen")
+    rules["ps"].get(("0101", "pro"))     # as the compiled rules of compile_rules.py
+    compile_rules.replace_file(tbpath, outpath, rules, rules.lex)
+
+The file has a header, a directory with one entry per tier and the rules of
+every tier: the keys (item and old value, joined by \\x1f, in UTF-8) sorted
+bytewise, with an array of their offsets, and the new values with an array of
+their offsets. A key is found by binary search over the offsets. The report of
+the compilation (conflicts and cycles) is kept in the file too.
+
+    header:     magic (8 bytes), version, lex (8 bytes), no. of tiers,
+                position and length of the report
+    directory:  per tier: name (16 bytes), no. of rules, position of the key
+                offsets, the keys, the value offsets and the values
+All numbers are little-endian, offsets are 4 bytes and positions 8 bytes.
+
+Usage (from the Toolbox_scripts folder):
+    python frozen_rules.py TABLE [TABLE ...] [--output Output_files/<iso>-rules.frozen] [--lex lxid]
+
+Assumptions:
+    - The tables are compiled with compile_rules.load_rules, in the given
+    order; the rules are not compiled again when a table changes, so freeze
+    them again after a change
+"""
+import os, sys, mmap, time, struct, argparse
+import toolbox_io, compile_rules
+
+# set the paths where files will be read/written
+wripath = "Output_files/"# path for the frozen rules
+
+MAGIC = b"TBRULES\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sI8sIQQ")
+TIER = struct.Struct("<16sIQQQQ")
+SEP = b"\x1f"# between the item and the old value of a key
+
+def blob(values):
+    """Return the offsets (n+1) and the joined bytes of a list of byte strings."""
+    offsets = [0]
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return struct.pack("<{}I".format(len(offsets)), *offsets), b"".join(values)
+
+def freeze(compiled, path, lex="lxid", report=()):
+    """Write compiled rules to a frozen rules file.
+
+    compiled (dict): the rules {tier: {(item, old): new}}, see compile_rules.py
+    path (str): the frozen rules file
+    lex (str): the column identifying the items, 'lxid' or 'lx'
+    report (list): the report lines of the compilation
+    """
+    tiers = []
+    for tier, rules in compiled.items():
+        keys = sorted((item.encode("utf-8") + SEP + old.encode("utf-8"), new.encode("utf-8"))
+                      for (item, old), new in rules.items())
+        tiers.append((tier, keys))
+
+    # the positions of the parts follow from their lengths
+    report = "\n".join(report).encode("utf-8")
+    pos = HEADER.size + TIER.size * len(tiers)
+    report_pos, pos = pos, pos + len(report)
+    entries, parts = [], [report]
+    for tier, keys in tiers:
+        koffsets, kblob = blob([k for k, v in keys])
+        voffsets, vblob = blob([v for k, v in keys])
+        positions = []
+        for part in (koffsets, kblob, voffsets, vblob):
+            positions.append(pos)
+            parts.append(part)
+            pos += len(part)
+        entries.append(TIER.pack(tier.encode("utf-8"), len(keys), *positions))
+
+    # write to a temporary file first, so that readers never see half a file
+    temp = path + ".tmp"
+    with open(temp, "wb") as ffile:
+        ffile.write(HEADER.pack(MAGIC, VERSION, lex.encode("utf-8"), len(tiers), report_pos, len(report)))
+        for part in entries + parts:
+            ffile.write(part)
+    os.replace(temp, path)
+
+class FrozenTier(object):
+    """The rules of one tier, looked up in the mapped file."""
+
+    def __init__(self, data, n, koffsets, keys, voffsets, values):
+        self.data, self.n = data, n
+        self.koffsets, self.keys, self.voffsets, self.values = koffsets, keys, voffsets, values
+
+    def _blob(self, offsets, start, num):
+        begin, end = struct.unpack_from("<2I", self.data, offsets + 4 * num)
+        return self.data[start + begin:start + end]
+
+    def key(self, num):
+        """Return the key bytes of a rule."""
+        return self._blob(self.koffsets, self.keys, num)
+
+    def get(self, key, default=None):
+        """Return the new value of an (item, old) key, like dict.get."""
+        target = key[0].encode("utf-8") + SEP + key[1].encode("utf-8")
+        low, high = 0, self.n
+        while low < high:
+            mid = (low + high) // 2
+            if self.key(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.n and self.key(low) == target:
+            return self._blob(self.voffsets, self.values, low).decode("utf-8")
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        new = self.get(key)
+        if new is None:
+            raise KeyError(key)
+        return new
+
+    def __len__(self):
+        return self.n
+
+    def items(self):
+        """Iterate and yield ((item, old), new) in key order."""
+        for num in range(self.n):
+            item, old = self.key(num).decode("utf-8").split("\x1f", 1)
+            yield (item, old), self._blob(self.voffsets, self.values, num).decode("utf-8")
+
+class FrozenRules(object):
+    """A frozen rules file, used like the compiled rules {tier: {(item, old): new}}."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as ffile:
+            self.data = mmap.mmap(ffile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, lex, n_tiers, report_pos, report_len = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("{} is not a frozen rules file (version {})".format(path, VERSION))
+        self.lex = lex.rstrip(b"\x00").decode("utf-8")
+        self.report = [line for line in
+                       self.data[report_pos:report_pos + report_len].decode("utf-8").split("\n") if line]
+        self.tiers = {}
+        for num in range(n_tiers):
+            name, n, *positions = TIER.unpack_from(self.data, HEADER.size + TIER.size * num)
+            self.tiers[name.rstrip(b"\x00").decode("utf-8")] = FrozenTier(self.data, n, *positions)
+
+    def __getstate__(self):
+        # other processes map the file themselves instead of receiving a copy
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def close(self):
+        self.tiers = {}
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, tier):
+        return self.tiers[tier]
+
+    def __contains__(self, tier):
+        return tier in self.tiers
+
+    def __iter__(self):
+        return iter(self.tiers)
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def items(self):
+        return self.tiers.items()
+
+    def values(self):
+        return self.tiers.values()
+
+def is_frozen(path):
+    """Return True if a file is a frozen rules file."""
+    try:
+        with open(path, "rb") as ffile:
+            return ffile.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile replacement tables into a frozen rules file.")
+    parser.add_argument("tables", nargs="+", help="the replacement tables, in the order they apply")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--output", help="the frozen rules file (default Output_files/<iso>-rules.frozen)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(wripath, toolbox_io.file_iso(args.tables[0]) + "-rules.frozen")
+    outdir = os.path.dirname(output)
+    if outdir and not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    start = time.perf_counter()
+    compiled, chains, report = compile_rules.load_rules(args.tables, args.lex)
+    compiling = time.perf_counter() - start
+    for line in report:
+        print(line)
+    freeze(compiled, output, args.lex, report)
+
+    # check the file and compare the time it takes to open with that of compiling the tables
+    start = time.perf_counter()
+    with FrozenRules(output) as rules:
+        opening = time.perf_counter() - start
+        for tier, trules in compiled.items():
+            for key, new in trules.items():
+                if rules[tier].get(key) != new:
+                    print("{}: \\{} {} not frozen correctly".format(output, tier, key))
+                    return 1
+    print("{} rules of {} tiers frozen in {} ({} bytes)".format(
+        sum(len(r) for r in compiled.values()), len(compiled), output, os.path.getsize(output)))
+    print("compiling the tables: {:.3f} s, opening the frozen rules: {:.6f} s".format(compiling, opening))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Script builds a persistent inverted index of the Toolbox corpus files, so that
+questions like "which utterances use lxid 0123" or "which utterances will this
+replacement table change" can be answered without a replacement run.
+
+Every morpheme slot of every utterance is stored as one row in an SQLite
+database, with the position of the slot (file, \\ref, word index, morpheme
+index) and its value on the \\tx, \\mb, \\ph, \\ge, \\ps and \\lxid tiers. Each
+tier has its own index, which maps a value to all of its positions. Words and
+morphemes are extracted the same way as in the replacement scripts.
+
+Usage (from the Toolbox_scripts folder):
+    python lexical_index.py build
+    python lexical_index.py find lxid 0123
+    python lexical_index.py impact Dictionaries/kha-replacetable.xlsx --tier ps
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder
+    - The index is written to 'idxpath' and only files that changed since the
+    last build are parsed again
+"""
+import os, sys, time, sqlite3, argparse
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+idxpath = "Output_files/lexical_index.sqlite"# path for the index database
+
+# the tiers stored for every morpheme slot, \tx holds the word of the slot
+tiers = ("tx", "mb", "ph", "ge", "ps", "lxid")
+
+def connect(dbpath=idxpath):
+    """Open the index database, creating its tables if necessary.
+
+    dbpath (str): the database file
+    """
+    dbdir = os.path.dirname(dbpath)
+    if dbdir and not os.path.exists(dbdir):
+        os.makedirs(dbdir)
+    db = sqlite3.connect(dbpath)
+    db.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, "
+               "path TEXT UNIQUE, mtime REAL, size INTEGER)")
+    db.execute("CREATE TABLE IF NOT EXISTS slots (file INTEGER, ref TEXT, "
+               "word INTEGER, morpheme INTEGER, {})".format(
+                   ", ".join(tier + " TEXT" for tier in tiers)))
+    # one index per tier maps a value to its positions
+    for tier in tiers:
+        db.execute("CREATE INDEX IF NOT EXISTS slots_{0} ON slots ({0})".format(tier))
+    db.execute("CREATE INDEX IF NOT EXISTS slots_file ON slots (file)")
+    return db
+
+def iter_slots(tbpath):
+    """Iterate and yield (ref, word index, morpheme index, tier values...) for
+    every morpheme slot of a corpus file.
+
+    tbpath (str): the corpus file
+    """
+    with toolbox_io.open_corpus(tbpath) as tfile:
+        for textid, ref in toolbox_io.iter_utterances(tfile):
+            refid = ref["\\ref"].strip()
+            for w, (word, morphemes) in enumerate(toolbox_io.build_words(ref)):
+                # take the longest morpheme tier as the number of slots
+                n_units = max([len(m) for m in morphemes.values()] or [0])
+                for m in range(n_units):
+                    values = [word]
+                    for tier in tiers[1:]:
+                        units = morphemes.get("\\" + tier, [])
+                        values.append(units[m] if m < len(units) else None)
+                    yield (refid, w, m) + tuple(values)
+
+def build(db, corpath=corpath):
+    """Add new or changed corpus files to the index and drop removed ones.
+
+    db (connection): the index database
+    corpath (str): the folder with the corpus files
+    """
+    known = {path: (fid, mtime, size) for fid, path, mtime, size
+             in db.execute("SELECT id, path, mtime, size FROM files")}
+    current = toolbox_io.corpus_files(corpath)
+
+    with db:
+        # drop files that are no longer in the corpus
+        for path in set(known) - set(current):
+            db.execute("DELETE FROM slots WHERE file = ?", (known[path][0],))
+            db.execute("DELETE FROM files WHERE id = ?", (known[path][0],))
+            print("removed", path)
+
+        for tbpath in current:
+            stat = os.stat(tbpath)
+            # skip files that did not change since the last build
+            if tbpath in known and known[tbpath][1:] == (stat.st_mtime, stat.st_size):
+                continue
+            if tbpath in known:
+                fid = known[tbpath][0]
+                db.execute("DELETE FROM slots WHERE file = ?", (fid,))
+                db.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                           (stat.st_mtime, stat.st_size, fid))
+            else:
+                fid = db.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                 (tbpath, stat.st_mtime, stat.st_size)).lastrowid
+            db.executemany("INSERT INTO slots VALUES (?, ?, ?, ?, {})".format(
+                               ", ".join("?" for tier in tiers)),
+                           ((fid,) + slot for slot in iter_slots(tbpath)))
+            print("indexed", tbpath)
+
+def find(db, tier, value):
+    """Return all (file, ref, word, morpheme) positions of a value on a tier.
+
+    db (connection): the index database
+    tier (str): the tier, i.e. 'lxid' or 'ps'
+    value (str): the value to look up
+    """
+    if tier not in tiers:
+        raise ValueError("unknown tier '{}'".format(tier))
+    return db.execute("SELECT files.path, ref, word, morpheme FROM slots "
+                      "JOIN files ON files.id = slots.file WHERE {} = ? "
+                      "ORDER BY files.path, slots.rowid".format(tier), (value,)).fetchall()
+
+def impact(db, table, tier, lex="lxid", old=None, new=None):
+    """Return the utterances each row of a replacement table would change.
+
+    Returns a list of (key, old, new, [(file, ref), ...]) tuples.
+
+    db (connection): the index database
+    table (str): the replacement table (XLSX), with columns lex, old_<tier>
+    and new_<tier>
+    tier (str): the tier to replace
+    lex (str): the column identifying the item, 'lxid' or 'lx' (matched on \\mb)
+    old, new (str): the columns with old and new values, if not old_<tier>
+    and new_<tier>
+    """
+    if tier not in tiers:
+        raise ValueError("unknown tier '{}'".format(tier))
+    tdf = toolbox_io.read_reptable(table, lex)
+    key = "lxid" if lex == "lxid" else "mb"
+    old = old or "old_" + tier
+    new = new or "new_" + tier
+
+    # rows without an item, old or new value are skipped, as in compile_rules.table_rules
+    result = []
+    for item, oldval, newval in tdf[[lex, old, new]].dropna().itertuples(index=False):
+        item, oldval, newval = item.strip(), oldval.strip(), newval.strip()
+        hits = db.execute("SELECT DISTINCT files.path, ref FROM slots "
+                          "JOIN files ON files.id = slots.file "
+                          "WHERE {} = ? AND {} = ?".format(key, tier),
+                          (item, oldval)).fetchall()
+        result.append((item, oldval, newval, hits))
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--index", default=idxpath, help="the index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cbuild = commands.add_parser("build", help="build or update the index")
+    cbuild.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    cfind = commands.add_parser("find", help="find all uses of a value on a tier")
+    cfind.add_argument("tier", choices=tiers)
+    cfind.add_argument("value")
+    cimpact = commands.add_parser("impact", help="utterances changed by a replacement table")
+    cimpact.add_argument("table")
+    cimpact.add_argument("--tier", default="ps", choices=tiers, help="the tier to replace")
+    cimpact.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    cimpact.add_argument("--old", help="column with the old values (default old_<tier>)")
+    cimpact.add_argument("--new", help="column with the new values (default new_<tier>)")
+    args = parser.parse_args(argv)
+
+    db = connect(args.index)
+    start = time.perf_counter()
+    if args.command == "build":
+        build(db, args.corpus)
+    elif args.command == "find":
+        hits = find(db, args.tier, args.value)
+        for path, ref, word, morpheme in hits:
+            print("{}\t{}\tword {}\tmorpheme {}".format(path, ref, word, morpheme))
+        print("{} hits".format(len(hits)))
+    elif args.command == "impact":
+        for key, old, new, hits in impact(db, args.table, args.tier, args.lex,
+                                                  args.old, args.new):
+            print("{} '{}' -> '{}': {} utterances".format(key, old, new, len(hits)))
+            for path, ref in hits:
+                print("\t{}\t{}".format(path, ref))
+    print("done in {:.1f} ms".format((time.perf_counter() - start) * 1000), file=sys.stderr)
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+An in-memory index of a Toolbox (MDF) dictionary, which is parsed once and can
+be saved as a snapshot that loads much faster than parsing the text again.
+
+Entries are kept as tuples of (marker, value) tuples, in the order of the
+file, and are indexed by (\\lx, \\hm), so that homonyms do not collide, by
+\\lxid, by \\ps and by \\ge.
+
+    lexicon = Lexicon.load("Dictionaries/kha-Dictionary.txt")
+    lexicon.get("ka", "2")      # the fields of the entry, as a dict
+    lexicon.by_id("0123")
+    lexicon.with_ps("v")        # the fields of all entries tagged 'v'
+
+The dictionary scripts (check_terms.py, dict_replace_new.py) read the entries
+by marker name, see named_fields.
+
+Run the script to build the snapshot of a dictionary and print its size:
+    python lexicon.py Dictionaries/kha-Dictionary.txt
+"""
+import os, sys, pickle, argparse
+import toolbox_io
+
+# path for the snapshots
+wripath = "Output_files/"
+
+class Lexicon(object):
+    """Index of the entries of a Toolbox dictionary."""
+
+    # the version of the snapshot format
+    version = 1
+
+    def __init__(self, entries=(), source=None):
+        """Build the indexes from entries, lists of (marker, value) tuples.
+
+        entries (iterable): the dictionary entries
+        source (tuple): (path, mtime, size) of the dictionary file
+        """
+        self.source = source
+        self.entries = []
+        self.lx_hm = {} # (lx, hm) -> entry no.
+        self.lxid = {} # lxid -> entry no.
+        self.ps = {} # ps -> [entry no., ...]
+        self.ge = {} # ge -> [entry no., ...]
+        self.duplicates = [] # keys that occur more than once
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        """Add an entry, a list of (marker, value) tuples, to the indexes."""
+        # intern the markers and the values, which repeat a lot (i.e. tags)
+        entry = tuple((sys.intern(marker), sys.intern(value.strip())) for marker, value in entry)
+        num = len(self.entries)
+        self.entries.append(entry)
+        fields = toolbox_io.entry_fields(entry)
+
+        key = (fields.get("\\lx", ""), fields.get("\\hm", ""))
+        if key in self.lx_hm:
+            self.duplicates.append(key)
+        self.lx_hm[key] = num
+        if fields.get("\\lxid"):
+            lxid = fields["\\lxid"].zfill(4)
+            if lxid in self.lxid:
+                self.duplicates.append(lxid)
+            self.lxid[lxid] = num
+        for marker, index in (("\\ps", self.ps), ("\\ge", self.ge)):
+            # every value of the marker, entries may have more than one sense
+            for value in set(v for m, v in entry if m == marker):
+                index.setdefault(value, []).append(num)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def fields(self, num):
+        """Return the first value of every marker of an entry as a dict."""
+        return toolbox_io.entry_fields(self.entries[num])
+
+    def get(self, lx, hm=""):
+        """Return the fields of the entry with a headword and homonym no., or None."""
+        num = self.lx_hm.get((lx, str(hm)))
+        return None if num is None else self.fields(num)
+
+    def by_id(self, lxid):
+        """Return the fields of the entry with an lxid, or None."""
+        num = self.lxid.get(str(lxid).zfill(4))
+        return None if num is None else self.fields(num)
+
+    def with_ps(self, ps):
+        """Return the fields of all entries with a part of speech."""
+        return [self.fields(num) for num in self.ps.get(ps, [])]
+
+    def with_ge(self, ge):
+        """Return the fields of all entries with a gloss."""
+        return [self.fields(num) for num in self.ge.get(ge, [])]
+
+    @classmethod
+    def from_file(cls, dfile):
+        """Parse a Toolbox dictionary."""
+        stat = os.stat(dfile)
+        with toolbox_io.open_corpus(dfile) as tbfile:
+            return cls(toolbox_io.iter_entries(tbfile),
+                       (os.path.abspath(dfile), stat.st_mtime, stat.st_size))
+
+    def save(self, path):
+        """Save a snapshot of the lexicon."""
+        # write to a temporary file first, so that jobs loading the same
+        # dictionary in parallel never read half a snapshot
+        temp = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp, "wb") as pfile:
+            pickle.dump((self.version, self.__dict__), pfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Load a snapshot of a lexicon, returns None if it is from another version."""
+        with open(path, "rb") as pfile:
+            version, state = pickle.load(pfile)
+        if version != cls.version:
+            return None
+        lexicon = cls.__new__(cls)
+        lexicon.__dict__.update(state)
+        return lexicon
+
+    @classmethod
+    def load(cls, dfile, snapshot=None):
+        """Load a dictionary from its snapshot, or parse it and save the snapshot.
+
+        The snapshot is only used if the dictionary did not change since it
+        was saved.
+
+        dfile (str): the Toolbox dictionary
+        snapshot (str): the snapshot, default 'wripath'/<dictionary>.lexicon.pickle
+        """
+        snapshot = snapshot or snapshot_path(dfile)
+        stat = os.stat(dfile)
+        if os.path.exists(snapshot):
+            lexicon = cls.from_snapshot(snapshot)
+            if lexicon and lexicon.source == (os.path.abspath(dfile), stat.st_mtime, stat.st_size):
+                return lexicon
+        lexicon = cls.from_file(dfile)
+        snapdir = os.path.dirname(snapshot)
+        if snapdir and not os.path.exists(snapdir):
+            os.makedirs(snapdir)
+        lexicon.save(snapshot)
+        return lexicon
+
+def named_fields(entry, markers):
+    """Return the values of an entry by marker name, as the dictionary scripts use them.
+
+    A marker that repeats (i.e. the \\ps of every sense) is joined with
+    newlines and the marker, so that it is written back as separate lines, and
+    markers not in 'markers' are left out.
+
+    entry (iterable): the (marker, value) tuples of the entry
+    markers (dict): the marker names and markers, i.e. {'lx': "\\lx ", 'ps': "\\ps "}
+    """
+    names = {}
+    for name, marker in markers.items():
+        names.setdefault(marker.strip(), name)
+    fields = {}
+    for marker, value in entry:
+        name = names.get(marker)
+        if name is None:
+            continue
+        # the rest of the line after the marker, which may not end with a space
+        value = (marker + " " + value)[len(markers[name]):]
+        if name in fields:
+            fields[name] += "\n" + markers[name] + value
+        else:
+            fields[name] = value
+    return fields
+
+def snapshot_path(dfile):
+    """Return the default snapshot path of a dictionary."""
+    return os.path.join(wripath, os.path.splitext(os.path.basename(dfile))[0] + ".lexicon.pickle")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the snapshot of a Toolbox dictionary.")
+    parser.add_argument("dicts", nargs="+", help="the Toolbox dictionaries")
+    args = parser.parse_args(argv)
+    for dfile in args.dicts:
+        lexicon = Lexicon.load(dfile)
+        print("{}: {} entries, {} with lxid, {} parts of speech, {} duplicate keys -> {}".format(
+            dfile, len(lexicon), len(lexicon.lxid), len(lexicon.ps), len(lexicon.duplicates),
+            snapshot_path(dfile)))
+
+if __name__ == "__main__":
+    main()
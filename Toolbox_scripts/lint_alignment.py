@@ -0,0 +1,182 @@
+"""
+Script checks the interlinear alignment of corpus files without replacing
+anything, and lists every problem with its \\ref, so that it can be run on a
+whole corpus before a replacement run (or before files are committed):
+    - missing: a tier of 'required' does not occur in the utterance
+    - empty: a tier occurs but has no content
+    - word count: a morpheme tier has more or fewer words (m-words) than \\tx
+    - morpheme count: a word has more or fewer morphemes on a tier than on \\mb
+    - column drift: a morpheme does not start in the same column as the \\mb
+    morpheme above it, or a \\tx word does not start above an \\mb morpheme
+Words and morphemes are counted the same way as in the replacement scripts
+(see toolbox_io.build_words). Columns are counted in UTF-8 bytes, as the
+replacement scripts align them, or in characters with --chars.
+
+Usage (from the Toolbox_scripts folder):
+    python lint_alignment.py [Corpus_files/ ...] [--output Output_files/alignment.csv]
+
+Assumptions:
+    - Folders are searched for corpus files recursively, files can be given too
+    - The problems are written to a CSV file with the columns file, line, ref,
+    problem, tier and detail, sorted by file and line
+    - The script exits with 1 if there are problems
+"""
+import os, re, sys, csv, glob, argparse
+from concurrent.futures import ProcessPoolExecutor
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+wripath = "Output_files/alignment.csv"# path for the report
+
+# the tiers every utterance should have
+required = ("\\tx", "\\mb", "\\ge", "\\ps")
+
+def starts(line, chars=False):
+    """Return the columns where the tokens of a tier line start."""
+    if chars:
+        return [token.start() for token in re.finditer(r"\S+", line)]
+    return [token.start() for token in re.finditer(rb"\S+", line.encode("utf-8"))]
+
+def drift(block, chars=False):
+    """Return the column drift problems of one block of aligned tier lines.
+
+    block (dict): the lines of the block without their markers, i.e.
+    {"\\tx": "...", "\\mb": "...", ...}; the marker is the same length on all
+    lines of a block, so it does not change the columns
+    """
+    problems = []
+    if "\\mb" not in block:
+        return problems
+    mbs = starts(block["\\mb"], chars)
+    for tier, line in block.items():
+        if tier == "\\mb" or tier not in toolbox_io.MORPHEME_TIERS + ("\\tx",):
+            continue
+        columns = starts(line, chars)
+        if tier == "\\tx":
+            # every word starts above a morpheme
+            off = [c for c in columns if c not in set(mbs)]
+            if off:
+                problems.append((tier, "word at column {} is not above a \\mb morpheme".format(off[0])))
+            continue
+        for num, (expected, found) in enumerate(zip(mbs, columns)):
+            if expected != found:
+                problems.append((tier, "morpheme {} starts at column {}, \\mb at {}".format(num, found, expected)))
+                break
+    return problems
+
+def count_problems(ref, words, tiers):
+    """Return the missing/empty tiers and word/morpheme count problems of an utterance."""
+    problems = []
+    for tier in required:
+        if tier not in ref:
+            problems.append(("missing", tier, ""))
+        elif not ref[tier].strip():
+            problems.append(("empty", tier, ""))
+    n_words = len([w for w, m in words if w])
+    for tier in tiers:
+        n_mwords = len([1 for w, m in words if tier in m])
+        if "\\tx" in ref and n_mwords != n_words:
+            problems.append(("word count", tier, "{} words, \\tx has {}".format(n_mwords, n_words)))
+    for num, (word, morphemes) in enumerate(words):
+        if "\\mb" not in morphemes:
+            continue
+        for tier in tiers:
+            if tier in morphemes and len(morphemes[tier]) != len(morphemes["\\mb"]):
+                problems.append(("morpheme count", tier, "word {} '{}': {} morphemes, \\mb has {}".format(
+                    num, word, len(morphemes[tier]), len(morphemes["\\mb"]))))
+    return problems
+
+def iter_raw_records(lines):
+    """Iterate and yield (line number, lines) of the records of a Toolbox file."""
+    record, first = [], 1
+    for num, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line.startswith(("\\_sh", "\\id", "\\ref")):
+            if record:
+                yield first, record
+            record, first = [], num
+        record.append(line)
+    if record:
+        yield first, record
+
+def iter_blocks(record):
+    """Iterate and yield the blocks of aligned tier lines of a record.
+
+    A block starts with a \\tx line (or a morpheme tier line after another
+    tier) and holds the morpheme tier lines that follow it. Blocks with
+    continuation lines are not yielded, since their columns are not known.
+    """
+    aligned = ("\\tx",) + toolbox_io.MORPHEME_TIERS
+    block, broken = {}, False
+    for line in record:
+        marker = line.split(None, 1)[0] if line.startswith("\\") else None
+        if marker is None:
+            broken = broken or bool(line.strip())
+            continue
+        if marker not in aligned or marker == "\\tx" or marker in block:
+            if block and not broken:
+                yield block
+            block, broken = {}, False
+        if marker in aligned:
+            block[marker] = line[len(marker):]
+    if block and not broken:
+        yield block
+
+def lint_file(path, chars=False):
+    """Return the problems of a corpus file as (file, line, ref, problem, tier, detail) rows."""
+    rows = []
+    with toolbox_io.open_corpus(path) as tfile:
+        for first, record in iter_raw_records(tfile):
+            ref = next(toolbox_io.iter_records(record), {})
+            if "\\ref" not in ref:
+                continue
+            refid = ref["\\ref"].strip()
+            words = toolbox_io.build_words(ref)
+            tiers = toolbox_io.utterance_tiers(ref)
+            for problem, tier, detail in count_problems(ref, words, tiers):
+                rows.append((path, first, refid, problem, tier, detail))
+            for block in iter_blocks(record):
+                for tier, detail in drift(block, chars):
+                    rows.append((path, first, refid, "column drift", tier, detail))
+    return rows
+
+def find_files(paths):
+    """Return the corpus files in the given files and folders (searched recursively)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder in sorted(set([path] + glob.glob(os.path.join(path, "**", ""), recursive=True))):
+                files.extend(toolbox_io.corpus_files(folder))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the alignment of interlinear corpus files.")
+    parser.add_argument("paths", nargs="*", default=[corpath], help="corpus files or folders")
+    parser.add_argument("--output", default=wripath, help="the report (CSV)")
+    parser.add_argument("--chars", action="store_true", help="count columns in characters, not UTF-8 bytes")
+    parser.add_argument("--workers", type=int, help="number of files to check in parallel")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    rows = []
+    with ProcessPoolExecutor(args.workers) as pool:
+        for frows in pool.map(lint_file, files, [args.chars] * len(files), chunksize=8):
+            rows.extend(frows)
+    rows.sort(key=lambda row: (row[0], row[1]))
+
+    outdir = os.path.dirname(args.output)
+    if outdir and not os.path.exists(outdir):
+        os.makedirs(outdir)
+    with open(args.output, "w", encoding="utf-8", newline="") as rfile:
+        report = csv.writer(rfile)
+        report.writerow(["file", "line", "ref", "problem", "tier", "detail"])
+        report.writerows(rows)
+    print("{} files, {} problems in {} utterances, see {}".format(
+        len(files), len(rows), len({(r[0], r[1]) for r in rows}), args.output))
+    return 1 if rows else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
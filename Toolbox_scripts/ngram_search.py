@@ -0,0 +1,265 @@
+"""
+Script searches the corpus files for sequences of tags, glosses or morphemes,
+i.e. 'v pro n' on \\ps or 'NEG be.able' on \\ge, using a persistent n-gram
+index, so that a search does not have to read the corpus again.
+
+The index is an SQLite database with the token sequences of every utterance
+on the \\tx, \\mb, \\ge and \\ps tiers, at word level (the morphemes of a word
+joined, i.e. 'clitic=n') and at morpheme level (one token per morpheme, \\tx
+then holds the word of the morpheme), and all n-grams (n <= 4) of the \\mb,
+\\ge and \\ps sequences with their positions. Words and morphemes are extracted
+with toolbox_io.build_words, like in the replacement scripts.
+
+A query is a list of token patterns, one per position:
+    v pro n             \\ps (the default tier) is v, then pro, then n
+    v * n               any token in the middle
+    3sg.*               glob wildcards within a token
+    ge=NEG ps=v         tier constraints per position
+    ps=v&ge=be.*        more than one constraint on the same position
+The longest run of positions without wildcards on one tier is looked up in the
+n-gram index, and every candidate is then checked against the stored sequences.
+
+Usage (from the Toolbox_scripts folder):
+    python ngram_search.py build
+    python ngram_search.py find v pro n
+    python ngram_search.py find NEG be.able --tier ge --level morpheme
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder
+    - The index is written to 'idxpath' and only files that changed since the
+    last build are parsed again
+    - Utterances with alignment errors (see toolbox_io.check_words) are not indexed
+"""
+import os, sys, time, sqlite3, argparse
+from fnmatch import fnmatchcase
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+idxpath = "Output_files/ngram_index.sqlite"# path for the index database
+
+# the tiers stored for every utterance, and those with an n-gram index
+tiers = ("tx", "mb", "ge", "ps")
+gram_tiers = ("mb", "ge", "ps")
+levels = ("word", "morpheme")
+# the longest n-gram in the index
+max_n = 4
+# the token separator in the database, tokens never contain whitespace
+sep = "\t"
+
+def connect(dbpath=idxpath):
+    """Open the index database, creating its tables if necessary.
+
+    dbpath (str): the database file
+    """
+    dbdir = os.path.dirname(dbpath)
+    if dbdir and not os.path.exists(dbdir):
+        os.makedirs(dbdir)
+    db = sqlite3.connect(dbpath)
+    db.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, "
+               "path TEXT UNIQUE, mtime REAL, size INTEGER)")
+    db.execute("CREATE TABLE IF NOT EXISTS utterances (id INTEGER PRIMARY KEY, file INTEGER, "
+               "ref TEXT, level TEXT, {})".format(", ".join(tier + " TEXT" for tier in tiers)))
+    db.execute("CREATE TABLE IF NOT EXISTS grams (gram TEXT, tier TEXT, level TEXT, "
+               "utterance INTEGER, pos INTEGER)")
+    db.execute("CREATE INDEX IF NOT EXISTS grams_gram ON grams (tier, level, gram)")
+    db.execute("CREATE INDEX IF NOT EXISTS utterances_file ON utterances (file)")
+    return db
+
+def sequences(words):
+    """Return the token sequences of an utterance per level and tier.
+
+    words (list): the words of an utterance, from toolbox_io.build_words
+    """
+    result = {level: {tier: [] for tier in tiers} for level in levels}
+    for word, morphemes in words:
+        result["word"]["tx"].append(word)
+        for tier in tiers[1:]:
+            result["word"][tier].append("".join(morphemes["\\" + tier]))
+        for m in range(len(morphemes["\\mb"])):
+            result["morpheme"]["tx"].append(word)
+            for tier in tiers[1:]:
+                result["morpheme"][tier].append(morphemes["\\" + tier][m])
+    return result
+
+def iter_utterances(tbpath):
+    """Iterate and yield (ref, sequences) for the utterances of a corpus file
+    that have all tiers and no alignment errors.
+
+    tbpath (str): the corpus file
+    """
+    needed = tuple("\\" + tier for tier in tiers[1:])
+    with toolbox_io.open_corpus(tbpath) as tfile:
+        for textid, ref in toolbox_io.iter_utterances(tfile):
+            words = toolbox_io.build_words(ref)
+            present = toolbox_io.utterance_tiers(ref)
+            if not set(needed) <= set(present) or toolbox_io.check_words(ref, words, present):
+                continue
+            yield ref["\\ref"].strip(), sequences(words)
+
+def index_file(db, fid, tbpath):
+    """Add the utterances and n-grams of a corpus file to the index."""
+    for refid, seqs in iter_utterances(tbpath):
+        for level in levels:
+            uid = db.execute("INSERT INTO utterances (file, ref, level, {}) VALUES (?, ?, ?, {})".format(
+                                 ", ".join(tiers), ", ".join("?" for tier in tiers)),
+                             (fid, refid, level) + tuple(sep.join(seqs[level][t]) for t in tiers)).lastrowid
+            grams = []
+            for tier in gram_tiers:
+                tokens = seqs[level][tier]
+                for pos in range(len(tokens)):
+                    for n in range(1, min(max_n, len(tokens) - pos) + 1):
+                        grams.append((sep.join(tokens[pos:pos + n]), tier, level, uid, pos))
+            db.executemany("INSERT INTO grams VALUES (?, ?, ?, ?, ?)", grams)
+
+def build(db, corpath=corpath):
+    """Add new or changed corpus files to the index and drop removed ones.
+
+    db (connection): the index database
+    corpath (str): the folder with the corpus files
+    """
+    known = {path: (fid, mtime, size) for fid, path, mtime, size
+             in db.execute("SELECT id, path, mtime, size FROM files")}
+    current = toolbox_io.corpus_files(corpath)
+
+    def drop(fid):
+        db.execute("DELETE FROM grams WHERE utterance IN (SELECT id FROM utterances WHERE file = ?)", (fid,))
+        db.execute("DELETE FROM utterances WHERE file = ?", (fid,))
+
+    with db:
+        # drop files that are no longer in the corpus
+        for path in set(known) - set(current):
+            drop(known[path][0])
+            db.execute("DELETE FROM files WHERE id = ?", (known[path][0],))
+            print("removed", path)
+
+        for tbpath in current:
+            stat = os.stat(tbpath)
+            # skip files that did not change since the last build
+            if tbpath in known and known[tbpath][1:] == (stat.st_mtime, stat.st_size):
+                continue
+            if tbpath in known:
+                fid = known[tbpath][0]
+                drop(fid)
+                db.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                           (stat.st_mtime, stat.st_size, fid))
+            else:
+                fid = db.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                 (tbpath, stat.st_mtime, stat.st_size)).lastrowid
+            index_file(db, fid, tbpath)
+            print("indexed", tbpath)
+
+def parse_query(query, tier="ps"):
+    """Turn a query into a list of {tier: pattern} constraints, one per position.
+
+    query (list): the token patterns, i.e. ['v', '*', 'ge=NEG']
+    tier (str): the tier of patterns without 'tier='
+    """
+    constraints = []
+    for token in query:
+        position = {}
+        for part in token.split("&"):
+            name, eq, pattern = part.partition("=")
+            # 'clitic=' is a tag, not a constraint on the 'clitic' tier
+            if eq and name in tiers and pattern:
+                position[name] = pattern
+            elif part != "*":
+                position[tier] = part
+        constraints.append(position)
+    return constraints
+
+def is_exact(pattern):
+    """Check whether a token pattern has no glob wildcards."""
+    return not any(c in pattern for c in "*?[")
+
+def anchor(constraints):
+    """Return the longest run of exact tokens on one tier as (tier, start, tokens), or None."""
+    best = None
+    for tier in gram_tiers:
+        start = 0
+        while start < len(constraints):
+            end = start
+            while end < len(constraints) and is_exact(constraints[end].get(tier, "*")):
+                end += 1
+            if end > start and (best is None or end - start > len(best[2])):
+                best = (tier, start, [c[tier] for c in constraints[start:end]])
+            start = end + 1
+    return best
+
+def matches(seqs, pos, constraints):
+    """Check whether the constraints match the sequences from a position on."""
+    if pos < 0 or pos + len(constraints) > len(seqs["tx"]):
+        return False
+    return all(fnmatchcase(seqs[tier][pos + i], pattern)
+               for i, position in enumerate(constraints) for tier, pattern in position.items())
+
+def search(db, query, tier="ps", level="word"):
+    """Return the hits of a query as (file, ref, position, {tier: tokens}) tuples.
+
+    db (connection): the index database
+    query (list): the token patterns, see parse_query
+    tier (str): the tier of patterns without 'tier='
+    level (str): 'word' or 'morpheme'
+    """
+    constraints = parse_query(query, tier)
+    select = "SELECT utterances.id, files.path, ref, {} FROM utterances JOIN files ON files.id = utterances.file ".format(
+        ", ".join(tiers))
+    found = anchor(constraints)
+    if found:
+        # the candidates are the positions of the exact run, minus its start
+        atier, offset, tokens = found
+        positions = {}
+        for uid, pos in db.execute("SELECT utterance, pos FROM grams WHERE tier = ? AND level = ? "
+                                   "AND gram = ?", (atier, level, sep.join(tokens[:max_n]))):
+            positions.setdefault(uid, []).append(pos - offset)
+        rows = ((row, sorted(positions[row[0]])) for uid in sorted(positions)
+                for row in db.execute(select + "WHERE utterances.id = ?", (uid,)))
+    else:
+        # no exact tokens, every utterance is a candidate
+        rows = ((row, None) for row in db.execute(select + "WHERE level = ? ORDER BY files.path, utterances.id",
+                                                  (level,)))
+
+    hits = []
+    for row, candidates in rows:
+        seqs = {t: (row[3 + i].split(sep) if row[3 + i] else []) for i, t in enumerate(tiers)}
+        for pos in (candidates if candidates is not None else range(len(seqs["tx"]))):
+            if matches(seqs, pos, constraints):
+                hits.append((row[1], row[2], pos,
+                             {t: seqs[t][pos:pos + len(constraints)] for t in tiers}))
+    return sorted(hits, key=lambda hit: (hit[0], hit[1], hit[2]))
+
+def format_hit(hit):
+    """Return a hit as text, with the tiers of the matched tokens aligned."""
+    path, ref, pos, tokens = hit
+    widths = [max(len(tokens[t][i]) for t in tiers) for i in range(len(tokens["tx"]))]
+    lines = ["{}\t{}\t{}".format(os.path.basename(path), ref, pos)]
+    for tier in tiers:
+        lines.append("\t\\{} {}".format(tier, " ".join(tok.ljust(w) for tok, w in zip(tokens[tier], widths)).rstrip()))
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--index", default=idxpath, help="the index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cbuild = commands.add_parser("build", help="build or update the index")
+    cbuild.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    cfind = commands.add_parser("find", help="find a sequence of tokens")
+    cfind.add_argument("query", nargs="+", help="the token patterns, i.e. v '*' n or ge=NEG ps=v")
+    cfind.add_argument("--tier", default="ps", choices=tiers, help="the tier of patterns without 'tier='")
+    cfind.add_argument("--level", default="word", choices=levels)
+    args = parser.parse_args(argv)
+
+    db = connect(args.index)
+    start = time.perf_counter()
+    if args.command == "build":
+        build(db, args.corpus)
+    elif args.command == "find":
+        hits = search(db, args.query, args.tier, args.level)
+        for hit in hits:
+            print(format_hit(hit))
+        print("{} hits".format(len(hits)))
+    print("done in {:.1f} ms".format((time.perf_counter() - start) * 1000), file=sys.stderr)
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -16,19 +16,20 @@ Assumptions:
     the replacement tables corresponding to 'IPA:' tiers in the annotated
     spreadsheets, and 'Old pos' and 'New pos' in the replacement tables
     corresponding to the 'pos:' tiers in the spreadsheets.
+
+    Run with '--stream' to read and write the spreadsheets with openpyxl in
+    read-only/write-only mode, one interlinearized entry at a time, so that
+    memory use is bounded by the size of an entry instead of the spreadsheet.
+
+    Run with '--workers N' to process the spreadsheets in N parallel processes,
+    each of which receives the replacement table once when it starts.
 """
-import sys, os, glob, re
-import pandas as pd
-import numpy as np
-from pandas import ExcelWriter
-from tqdm import tqdm
+import os, glob, re, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 tablespath = "Dictionaries/" # path for the replacement tables
 repath = "Corpus_files/" # path containing annotated spreadsheets
 wripath = "Output_files/"# path for new Toolbox corpus files
-# make the new corpus directory if it doesn't exist
-if not os.path.exists(wripath):
-    os.makedirs(wripath)
 # use this regex to split on morpheme boundaries = (clitic) and - (affix)
 free = r"(=|-)"
 
@@ -69,7 +70,10 @@ def replace_entries(repdict, reprange, repldict, nums, wds, pos, ipa, gl, free):
             pass
 
 # define a function to iterate through the spreadsheets and their entries
-def iterate_entries(tempdict, reprange, repldict, head, free):
+def iterate_entries(tempdict, reprange, repldict, head, free, outpath):
+    import numpy as np
+    import pandas as pd
+
     headers = [] # list to store the different headers for lines in the spreadsheet
     repdict = {} # dictionary to store each interlinearized sentence
     newdict = {} # dictionary to store the changed entries
@@ -117,35 +121,125 @@ def iterate_entries(tempdict, reprange, repldict, head, free):
     print(headers)
     newdf = pd.DataFrame.from_dict(newdict, orient='index')
     print(newdf.head())
-    newdf.to_excel(wripath+testpath[repathlen:-5]+"_replaced.xlsx", index=False, header=False)
+    newdf.to_excel(outpath, index=False, header=False)
+
+# define a function to stream a spreadsheet entry by entry, replacing items
+# like iterate_entries does and writing each entry out as soon as it is done
+def stream_entries(testpath, outpath, reprange, repldict, head, free):
+    from openpyxl import load_workbook, Workbook
+
+    # open the spreadsheet read-only, which parses the rows lazily
+    inbook = load_workbook(testpath, read_only=True, data_only=True)
+    insheet = inbook.worksheets[0]
+    insheet.reset_dimensions() # don't trust the stored sheet size
+    # the new spreadsheet is written row by row to a temporary file
+    outbook = Workbook(write_only=True)
+    outsheet = outbook.create_sheet()
+
+    repdict = {} # dictionary to store the current interlinearized sentence
+    pos, ipa, gl = None, None, None # line numbers of the tiers
+    # define a function to replace items in the stored entry and write it out
+    def flush(repdict):
+        for k, v in repdict.items():
+            # if the header corresponds to 'IPA:' then this is the line we check for lexical items
+            if v[0] == head:
+                # look at each subentry in this line
+                for nums, wds in v.items():
+                    replace_entries(repdict, reprange, repldict, nums, wds, pos, ipa, gl, free)
+        for k, v in repdict.items():
+            outsheet.append([v[col] for col in range(len(v))])
+
+    for key, row in enumerate(insheet.iter_rows(values_only=True)):
+        val = dict(enumerate(row)) if row else {0: None}
+        repdict[key] = val # store the line in the replacement entry dictionary
+        # if the header is blank, this is the end of an entry
+        if val[0] is None:
+            flush(repdict)
+            # reset the replacement entry to blank
+            repdict = {}
+        elif str(val[0])[:-1] == 'IPA':
+            ipa = key # set the line number for the IPA line
+        elif str(val[0])[:-1] == 'gloss':
+            gl = key # set the line number for the gloss line
+        elif str(val[0])[:-1] == 'pos':
+            pos = key # set the line number for the part of speech line
+    # store the last entry
+    flush(repdict)
+
+    inbook.close()
+    outbook.save(outpath)
 
-# store filenames of excel format replacement tables
-filenames = []
-for filen in glob.glob(tablespath+"*.xlsx"):
-    filenames.append(filen)
+# define a function to replace items in one annotated spreadsheet
+def replace_spreadsheet(testpath, reprange, repldict, stream=False):
+    import pandas as pd
 
-# store filenames of excel format annotated spreadsheets
-testfiles = []
-for filen in glob.glob(repath+"*.xlsx"):
-    testfiles.append(filen)
+    outpath = wripath+testpath[repathlen:-5]+"_replaced.xlsx"
+    if stream:
+        stream_entries(testpath, outpath, reprange, repldict, "IPA:", free)
+    else:
+        testdf = pd.read_excel(testpath, header=None) # read the spreadsheet as a dataframe
+        tempdict = testdf.to_dict(orient='index') # convert the spreadsheet to an embedded dict with index as keys
+        iterate_entries(tempdict, reprange, repldict, "IPA:", free, outpath)
+    return outpath
+
+# the replacement table of a worker process, set once when the worker starts
+worker_table = None
+
+def init_worker(reprange, repldict):
+    global worker_table
+    worker_table = (reprange, repldict)
+
+def replace_in_worker(testpath, stream):
+    reprange, repldict = worker_table
+    return replace_spreadsheet(testpath, reprange, repldict, stream)
 
 repathlen = len(repath) # the length of the path used when creating new files
 
-# open each replacement table
-for filen in filenames:
-    repiso = filen[len(tablespath):len(tablespath)+3]
-    repset = pd.read_excel(filen) # read the table into a dataframe
-    reprange = list(range(len(repset))) # get a list of the row numbers
-    repldict = repset.to_dict() # transform the dataframe into a dict for quicker access
-    # open each of the annotated spreadsheets and tqdm it to give a progress bar
-    for testpath in tqdm(testfiles):
-        tempiso = testpath[repathlen:repathlen+3]
-        if tempiso == repiso:
-            testdf = pd.read_excel(testpath, header=None) # read the spreadsheet as a dataframe
-            testlen = len(testdf) # check the length of the spreadsheet
-            # print(testdf.head()) # check the spreadsheet
-            # print(testlen) # print how many lines it has
-            tempdict = testdf.to_dict(orient='index') # convert the spreadsheet to an embedded dict with index as keys
-            # print(tempdict.keys())
-            # print(len(tempdict)) # check the length of the dict to ensure it is the same as the spreadsheet
-            iterate_entries(tempdict, reprange, repldict, "IPA:", free)
+def main(argv=None):
+    import pandas as pd
+    from tqdm import tqdm
+
+    parser = argparse.ArgumentParser(description="Replace items in annotated Excel spreadsheets.")
+    parser.add_argument("--stream", action="store_true",
+                        help="read and write the spreadsheets one entry at a time")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of spreadsheets to process in parallel")
+    args = parser.parse_args(argv)
+
+    # make the new corpus directory if it doesn't exist
+    if not os.path.exists(wripath):
+        os.makedirs(wripath)
+
+    # store filenames of excel format replacement tables
+    filenames = []
+    for filen in glob.glob(tablespath+"*.xlsx"):
+        filenames.append(filen)
+
+    # store filenames of excel format annotated spreadsheets
+    testfiles = []
+    for filen in glob.glob(repath+"*.xlsx"):
+        testfiles.append(filen)
+
+    # open each replacement table
+    for filen in filenames:
+        repiso = filen[len(tablespath):len(tablespath)+3]
+        repset = pd.read_excel(filen) # read the table into a dataframe
+        reprange = list(range(len(repset))) # get a list of the row numbers
+        repldict = repset.to_dict() # transform the dataframe into a dict for quicker access
+        # the annotated spreadsheets in the language of the replacement table
+        isofiles = [testpath for testpath in testfiles if testpath[repathlen:repathlen+3] == repiso]
+        if args.workers > 1 and len(isofiles) > 1:
+            # send the replacement table to each worker once, then the spreadsheets
+            with ProcessPoolExecutor(args.workers, initializer=init_worker,
+                                     initargs=(reprange, repldict)) as pool:
+                jobs = [pool.submit(replace_in_worker, testpath, args.stream) for testpath in isofiles]
+                # tqdm the finished jobs to give a progress bar across all workers
+                for job in tqdm(as_completed(jobs), total=len(jobs)):
+                    job.result()
+        else:
+            # open each of the annotated spreadsheets and tqdm it to give a progress bar
+            for testpath in tqdm(isofiles):
+                replace_spreadsheet(testpath, reprange, repldict, args.stream)
+
+if __name__ == "__main__":
+    main()
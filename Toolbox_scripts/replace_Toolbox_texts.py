@@ -4,31 +4,29 @@ replacement table/dictionary. Does this iteratively for files in specified
 directories.
 
 Assumptions:
-    - Corpus files are in TXT format and interlinearized, and file names begin
-    with an ISO code followed by a dash, i.e.: kuf-Texts.txt
+    - Corpus files are in TXT format (or compressed as .txt.gz, .txt.xz or
+    .txt.zst, the new files are compressed the same way) and interlinearized,
+    and file names begin with an ISO code followed by a dash, i.e.: kuf-Texts.txt
     - Replacement tables are in XLSX format, filenames begin with an ISO code
     followed by a dash, i.e.: kuf-Replacements.xlsx
     - Corpus files are in the 'corpath' folder
     - Replacement tables are in the 'dicpath' folder
     - New corpus files and logs are written to the 'wripath' folder
+    - Corpus files are read with the default encoding of open(), unless the
+    script is run with --detect-encoding
 
     Supported Toolbox tiers are \id, \ref \ELANBegin \ELANEnd, \ELANParticipant,
     \tx, \ph, \mb, \ge, \ps, \ft, \nt, \media
 """
-import os, re, sys, shutil, string, logging, glob
-import pandas as pd
+import os, re, sys, shutil, string, logging, glob, argparse
 from collections import OrderedDict
-from chardet.universaldetector import UniversalDetector
+import toolbox_io
 
 # set the paths where files will be read/written
 corpath = "Corpus_files/"# path for Toolbox corpus files
 dicpath = "Dictionaries/"# path for Toolbox replacement dictionaries (in XLSX format)
 wripath = "Output_files/"# path for new Toolbox corpus files
 
-# make the new corpus directory if it doesn't exist
-if not os.path.exists(wripath):
-    os.makedirs(wripath)
-
 # instantiate dict to save data of one utterance using a sorted dict because
 # order is important; key is the fieldmarker, value the tier content
 ref = OrderedDict()
@@ -331,6 +329,8 @@ def update_utterance(pdict):
                         twd, ps, pdict[twd]['psold'], pdict[twd]['psnew'], ref["\\ref"]))
 
 def get_repdict(dicfile):
+    import pandas as pd
+
     tdf = pd.read_excel(dicfile)
     tdf = tdf[['lx','Old pos','New pos']]
     tdf.columns = ['lx','psold','psnew']
@@ -346,65 +346,67 @@ def get_repdict(dicfile):
 
     return pdict
 
-corpfiles = []
-for fn in glob.glob(corpath+"*.txt"):
-    corpfiles.append(fn)
-
-dictfiles = []
-for fn in glob.glob(dicpath+"*.xlsx"):
-    dictfiles.append(fn)
-
-for tbpath in corpfiles:
-    tagslist = []
-    tbiso = tbpath[len(corpath):].split("-")[0]
-    # get the complete list of tiers in the dataset file
-    xfile = open(tbpath, "r")#, encoding=encoding)#"utf-8")#"utf-8")
-    for zline in xfile:
-        templine = re.split("\s+", zline)
-        if '\\' in templine[0]:
-            if templine[0] not in tagslist:
-                tagslist.append(templine[0])
-    print(tagslist)
-
-    for dicfile in dictfiles:
-        diciso = dicfile[len(dicpath):].split("-")[0]
-        if tbiso == diciso:
-            tbwpath = wripath+tbpath[len(corpath):]
-
-            # detects encoding
-            detector = UniversalDetector()
-            # reuse the detector by a reset
-            detector.reset()
-
-            # read (some) lines in binary mode to detect encoding
-            with open(tbpath, "rb") as f:
-                for line in f:
-                    detector.feed(line)
-                    if detector.done:
-                        break
-
-            detector.close()
-
-            # guessed encoding
-            encoding = detector.result["encoding"]
-
-            tfile = open(tbpath, "r")#, encoding=encoding)#"utf-8")#
-            tbwrite = open(tbwpath, "w", encoding="utf-8")#"utf-8")
-
-            logger = set_logger()
-            pdict = get_repdict(dicfile)
-
-            # go through each utterance of all corpus files
-            for utterance in iter_utterances(tfile):
-                # only process ref's (not \_sh for example)
-                if "\\ref" in utterance:
-                    # rebuild words/morphemes
-                    build_words()
-
-                # if there are no errors in the morpheme data
-                if not has_errors():
-                    # change data if necessary
-                    update_utterance(pdict)
-
-                # write (un)changed utterance back to file
-                write_file(tbwrite, rebuild=True)
+def main(argv=None):
+    # the logger and the tiers of the current file are used by the functions above
+    global logger, tagslist
+
+    parser = argparse.ArgumentParser(description="Replace items in Toolbox corpus files.")
+    parser.add_argument("--detect-encoding", action="store_true",
+                        help="guess the encoding of the corpus files instead of using the default one")
+    args = parser.parse_args(argv)
+
+    # make the new corpus directory if it doesn't exist
+    if not os.path.exists(wripath):
+        os.makedirs(wripath)
+
+    # plain and compressed (.gz, .xz, .zst) corpus files
+    corpfiles = toolbox_io.corpus_files(corpath)
+
+    dictfiles = []
+    for fn in glob.glob(dicpath+"*.xlsx"):
+        dictfiles.append(fn)
+
+    for tbpath in corpfiles:
+        tagslist = []
+        tbiso = tbpath[len(corpath):].split("-")[0]
+        # get the complete list of tiers in the dataset file
+        with toolbox_io.open_corpus(tbpath, args.detect_encoding) as xfile:
+            for zline in xfile:
+                templine = re.split("\s+", zline)
+                if '\\' in templine[0]:
+                    if templine[0] not in tagslist:
+                        tagslist.append(templine[0])
+        print(tagslist)
+
+        for dicfile in dictfiles:
+            diciso = dicfile[len(dicpath):].split("-")[0]
+            if tbiso == diciso:
+                tbwpath = wripath+tbpath[len(corpath):]
+
+                # open the (compressed) file, the new file is compressed like it
+                tfile = toolbox_io.open_corpus(tbpath, args.detect_encoding)
+                tbwrite = toolbox_io.open_output(tbwpath)
+
+                logger = set_logger()
+                pdict = get_repdict(dicfile)
+
+                # go through each utterance of all corpus files
+                for utterance in iter_utterances(tfile):
+                    # only process ref's (not \_sh for example)
+                    if "\\ref" in utterance:
+                        # rebuild words/morphemes
+                        build_words()
+
+                    # if there are no errors in the morpheme data
+                    if not has_errors():
+                        # change data if necessary
+                        update_utterance(pdict)
+
+                    # write (un)changed utterance back to file
+                    write_file(tbwrite, rebuild=True)
+
+                tfile.close()
+                tbwrite.close()
+
+if __name__ == "__main__":
+    main()
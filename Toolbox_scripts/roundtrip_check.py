@@ -0,0 +1,316 @@
+"""
+Script checks that reading and writing corpus files does not change them: it
+runs a replacement with an empty replacement table (which should change
+nothing) over the sample corpus files and a generated one, and compares the
+tokens of every tier of the output with those of the input. It also measures
+how fast each run is, so that a change that makes the scripts faster can be
+shown to be safe and faster with the same command. The time it takes to import
+each script (and toolbox.py) in a new Python process is measured as well,
+since a script that imports large libraries at the top is slow to start even
+for --help.
+
+The runs ('engines') are:
+    - toolbox_io: the shared reader/writer (toolbox_io.py, used by
+    compile_rules.py, toolbox_filter.py and the other corpus tools)
+    - replace_Toolbox_texts: the old replacement script
+    - replace_Toolbox_xx: the tier scripts in Toolbox_tier_scripts/
+    - add_lxid: add_lxid.py on the files without their \\lxid tiers, then
+    replace_Toolbox_ps.py on its output, to check that the tier scripts accept
+    the \\lxid tiers add_lxid.py writes (only \\lxid is compared, and the
+    utterances the tier script rejects are reported); \\ph is removed too,
+    since the tier scripts reject every utterance with a \\ph tier
+The scripts are run as they are, in a temporary folder with a Corpus_files,
+Dictionaries (with the empty table) and Output_files folder.
+
+For each file and tier, the tokens (whitespace-separated values, so that
+realignment does not count as a change) of all records are fed into a
+checksum, one record at a time, together with their number. A tier whose
+checksum differs between input and output is reported.
+
+Usage (from the Toolbox_scripts folder):
+    python roundtrip_check.py [--engine toolbox_io] [--utterances 5000]
+
+Assumptions:
+    - The sample corpus files are in the 'corpath' folder, the generated corpus
+    is called 'syn-Texts_synthetic.txt'
+    - The results are appended to 'wripath'/roundtrip_benchmark.csv, with the
+    time of the scripts including the start of Python; the import times are
+    added as rows of the engine 'import', with the module in the file column
+"""
+import os, sys, csv, time, random, shutil, hashlib, tempfile, argparse, subprocess
+from collections import OrderedDict
+import toolbox_io
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for the sample Toolbox corpus files
+dicpath = "Dictionaries/"# path for the dictionaries of the sample files (for add_lxid)
+wripath = "Output_files/"# path for the benchmark results
+
+# the scripts and the columns of their replacement tables
+scripts = OrderedDict([
+    ("replace_Toolbox_texts", ("replace_Toolbox_texts.py", ["lx", "Old pos", "New pos"])),
+    ("replace_Toolbox_tx", ("Toolbox_tier_scripts/replace_Toolbox_tx.py", ["lxid", "old_tx", "new_tx"])),
+    ("replace_Toolbox_mb", ("Toolbox_tier_scripts/replace_Toolbox_mb.py", ["lxid", "old_mb", "new_mb"])),
+    ("replace_Toolbox_ge", ("Toolbox_tier_scripts/replace_Toolbox_ge.py", ["lxid", "old_ge", "new_ge"])),
+    ("replace_Toolbox_ps", ("Toolbox_tier_scripts/replace_Toolbox_ps.py", ["lxid", "old_ps", "new_ps"])),
+])
+engines = ("toolbox_io",) + tuple(scripts) + ("add_lxid",)
+
+# the modules whose import time is measured
+modules = ("toolbox", "toolbox_io", "compile_rules", "replace_Toolbox_texts", "dict_replace_new",
+           "check_terms", "replace_Excel_texts")
+
+# the words of the generated corpus: (word, [(mb, ge, ps, lxid), ...])
+lexicon = [
+    ("ka", [("ka", "3sg.F", "pro", "0101")]),
+    ("u", [("u", "3sg.M", "pro", "0102")]),
+    ("jong", [("jong", "GEN", "prep", "0103")]),
+    ("la", [("la", "REAL", "mood", "0104")]),
+    ("ym", [("ym", "NEG", "neg", "0105")]),
+    ("lah", [("lah", "be.able", "v", "0106")]),
+    ("ka-kmie", [("ka=", "F=", "clitic=", "0107"), ("kmie", "mother", "n", "0108")]),
+    ("u-kpa", [("u=", "M=", "clitic=", "0109"), ("kpa", "father", "n", "0110")]),
+    ("yarap", [("ya-", "PLUR-", "prefix-", "0111"), ("rap", "help,carry", "v", "0112")]),
+    ("yoh-i", [("yoh", "get", "v", "0113"), ("-", "-", "-", "-"), ("i", "3sg.N", "pro", "0114")]),
+    ("kʔiuʔ", [("kyuh", "be.afraid,tremble", "v", "0115")]),
+    ("ïing", [("ïing", "house", "n", "0116")]),
+]
+
+def synthetic_corpus(path, utterances=5000, seed=1):
+    """Write a generated corpus file with texts, ELAN times and all morpheme tiers.
+
+    path (str): the corpus file
+    utterances (int): the number of utterances
+    seed (int): the seed of the random generator, the same seed gives the same file
+    """
+    rand = random.Random(seed)
+    tiers = ("\\mb", "\\ge", "\\ps", "\\lxid")
+    with open(path, "w", encoding="utf-8") as tbwrite:
+        tbwrite.write("\\_sh v3.0  400  Text\n\n")
+        begin = 0.0
+        for num in range(utterances):
+            if num % 500 == 0:
+                toolbox_io.write_record(tbwrite, OrderedDict([("\\id", "Synthetic{:03d}".format(num // 500))]))
+            words = []
+            for word, morphemes in (rand.choice(lexicon) for w in range(rand.randint(1, 12))):
+                words.append((word, {tier: [m[i] for m in morphemes] for i, tier in enumerate(tiers)}))
+            end = begin + rand.uniform(0.5, 6)
+            ref = OrderedDict([("\\ref", "Synthetic.{:05d}".format(num)),
+                               ("\\ELANBegin", "{:.3f}".format(begin)),
+                               ("\\ELANEnd", "{:.3f}".format(end)),
+                               ("\\ELANParticipant", rand.choice(("AB", "CD"))),
+                               ("\\ft", "free translation {}".format(num))])
+            if num % 7 == 0:
+                ref["\\nt"] = "note {}".format(num)
+            toolbox_io.write_record(tbwrite, ref, words, ("\\mb", "\\ge", "\\ps", "\\lxid"))
+            begin = end
+
+def synthetic_dictionary(path):
+    """Write a dictionary with an entry (with \\lxid) for every morpheme of the generated corpus."""
+    entries = sorted(set(m for word, morphemes in lexicon for m in morphemes if m[3] != "-"), key=lambda m: m[3])
+    with open(path, "w", encoding="utf-8") as dwrite:
+        dwrite.write("\\_sh v3.0  400  MDF 4.0\n")
+        for mb, ge, ps, lxid in entries:
+            dwrite.write("\n\\lx {}\n\\ps {}\n\\ge {}\n\\lxid {}\n".format(mb, ps, ge, lxid))
+
+def strip_tiers(path, outpath, tiers=("\\lxid",)):
+    """Write a corpus file without some of its tiers."""
+    with toolbox_io.open_corpus(path) as tfile, toolbox_io.open_output(outpath) as tbwrite:
+        for ref in toolbox_io.iter_records(tfile):
+            for tier in tiers:
+                ref.pop(tier, None)
+            toolbox_io.write_record(tbwrite, ref)
+
+def tier_checksums(path):
+    """Return {tier: (no. of tokens, checksum)} for a corpus file, and the no. of utterances.
+
+    path (str): the corpus file
+    """
+    sums, counts, utterances = {}, {}, 0
+    with toolbox_io.open_corpus(path) as tfile:
+        for ref in toolbox_io.iter_records(tfile):
+            utterances += "\\ref" in ref
+            for tier, value in ref.items():
+                tokens = value.split()
+                if tier not in sums:
+                    sums[tier], counts[tier] = hashlib.sha1(), 0
+                # the record separator keeps tokens that moved to another record apart
+                sums[tier].update(("\x1f".join(tokens) + "\x1e").encode("utf-8"))
+                counts[tier] += len(tokens)
+    return {tier: (counts[tier], sums[tier].hexdigest()) for tier in sums}, utterances
+
+def compare(before, after):
+    """Return the tiers whose tokens differ, as a list of descriptions."""
+    problems = []
+    for tier in list(before) + [t for t in after if t not in before]:
+        if tier not in after:
+            problems.append("{} missing".format(tier))
+        elif tier not in before:
+            problems.append("{} added".format(tier))
+        elif before[tier] != after[tier]:
+            problems.append("{} changed ({} -> {} tokens)".format(tier, before[tier][0], after[tier][0]))
+    return problems
+
+def run_toolbox_io(files, outdir):
+    """Run a no-op replacement with the shared reader/writer."""
+    import compile_rules
+
+    for tbpath in files:
+        compile_rules.replace_file(tbpath, os.path.join(outdir, os.path.basename(tbpath)), {})
+
+def run_script(engine, files, outdir):
+    """Run a replacement script with an empty table in a temporary folder.
+
+    Returns the refs of the utterances the script rejected because of their
+    word or morpheme numbers.
+    """
+    import pandas as pd
+
+    script, columns = scripts[engine]
+    script = os.path.abspath(script)
+    with tempfile.TemporaryDirectory() as workdir:
+        for folder in ("Corpus_files", "Dictionaries", "Output_files"):
+            os.makedirs(os.path.join(workdir, folder))
+        for tbpath in files:
+            shutil.copy(tbpath, os.path.join(workdir, "Corpus_files"))
+        for iso in set(toolbox_io.file_iso(f) for f in files):
+            pd.DataFrame(columns=columns).to_excel(
+                os.path.join(workdir, "Dictionaries", iso + "-noop.xlsx"), index=False)
+        result = subprocess.run([sys.executable, script], cwd=workdir, check=True, universal_newlines=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        for tbpath in files:
+            shutil.copy(os.path.join(workdir, "Output_files", os.path.basename(tbpath)), outdir)
+    # the scripts print 'ref|problem' for these utterances
+    return set(line.split("|")[0].strip() for line in result.stdout.splitlines()
+               if line.endswith("numbers don't match"))
+
+def run_lxid(files, outdir, engine="replace_Toolbox_ps"):
+    """Add \\lxid tiers with add_lxid.py and run a tier script on its output.
+
+    The files of add_lxid.py are kept in outdir/add_lxid. Returns the refs the
+    tier script rejected, see run_script.
+    """
+    lxiddir = os.path.join(outdir, "add_lxid")
+    with tempfile.TemporaryDirectory() as workdir:
+        for folder in ("Corpus_files", "Dictionaries"):
+            os.makedirs(os.path.join(workdir, folder))
+        for tbpath in files:
+            strip_tiers(tbpath, os.path.join(workdir, "Corpus_files", os.path.basename(tbpath)),
+                        ("\\lxid", "\\ph"))
+        for iso in set(toolbox_io.file_iso(f) for f in files):
+            dfile = os.path.join(workdir, "Dictionaries", iso + "-Dictionary.txt")
+            if iso == "syn":
+                synthetic_dictionary(dfile)
+            else:
+                shutil.copy(os.path.join(dicpath, iso + "-Dictionary.txt"), dfile)
+        subprocess.run([sys.executable, os.path.abspath("add_lxid.py"), "--output", lxiddir], cwd=workdir,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return run_script(engine, [os.path.join(lxiddir, os.path.basename(f)) for f in files], outdir)
+
+def import_time(module, repeat=3):
+    """Return the shortest time (s) to import a module in a new Python process."""
+    code = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+    times = []
+    for n in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code.format(module)], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True)
+        times.append(float(result.stdout.split()[-1]))
+    return min(times)
+
+def check(engine, files, outdir):
+    """Run an engine over corpus files and compare every output file with its input.
+
+    Returns the rows for the benchmark file.
+    """
+    start = time.perf_counter()
+    rejected = set()
+    if engine == "toolbox_io":
+        run_toolbox_io(files, outdir)
+    elif engine == "add_lxid":
+        rejected = run_lxid(files, outdir)
+    else:
+        rejected = run_script(engine, files, outdir)
+    seconds = time.perf_counter() - start
+
+    rows = []
+    size = sum(os.path.getsize(f) for f in files)
+    for tbpath in files:
+        before, utterances = tier_checksums(tbpath)
+        outpath = os.path.join(outdir, os.path.basename(tbpath))
+        after = tier_checksums(outpath)[0] if os.path.exists(outpath) else {}
+        if engine == "add_lxid":
+            # the \lxid tiers of add_lxid.py should pass the tier script unchanged
+            before = tier_checksums(os.path.join(outdir, "add_lxid", os.path.basename(tbpath)))[0]
+            before, after = ({t: v for t, v in sums.items() if t == "\\lxid"} for sums in (before, after))
+        problems = compare(before, after)
+        with toolbox_io.open_corpus(tbpath) as tfile:
+            n_rejected = len(rejected & set(ref["\\ref"].strip() for ref in toolbox_io.iter_records(tfile)
+                                            if "\\ref" in ref))
+        if n_rejected:
+            problems.append("{} utterances rejected".format(n_rejected))
+        # the time of a run is shared out over its files by their size
+        share = seconds * os.path.getsize(tbpath) / size if size else 0
+        rows.append([time.strftime("%Y-%m-%d %H:%M:%S"), engine, os.path.basename(tbpath),
+                     os.path.getsize(tbpath), utterances, round(share, 4),
+                     round(os.path.getsize(tbpath) / share / 1e6, 3) if share else "",
+                     not problems, "; ".join(problems)])
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that a no-op replacement preserves the corpus.")
+    parser.add_argument("--engine", action="append", choices=engines, help="the runs to check (default all)")
+    parser.add_argument("--corpus", default=corpath, help="folder with the sample corpus files")
+    parser.add_argument("--utterances", type=int, default=5000, help="size of the generated corpus")
+    parser.add_argument("--output", default=wripath, help="folder for the benchmark results")
+    parser.add_argument("--no-imports", dest="imports", action="store_false",
+                        help="do not measure the import times")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    benchpath = os.path.join(args.output, "roundtrip_benchmark.csv")
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        indir = os.path.join(tmp, "in")
+        os.makedirs(indir)
+        files = toolbox_io.corpus_files(args.corpus)
+        if args.utterances:
+            synthetic = os.path.join(indir, "syn-Texts_synthetic.txt")
+            synthetic_corpus(synthetic, args.utterances)
+            files.append(synthetic)
+
+        new = not os.path.exists(benchpath)
+        with open(benchpath, "a", encoding="utf-8", newline="") as bfile:
+            bench = csv.writer(bfile)
+            if new:
+                bench.writerow(["date", "engine", "file", "bytes", "utterances", "seconds",
+                                "MB/s", "identical", "problems"])
+            for engine in args.engine or engines:
+                outdir = os.path.join(tmp, engine)
+                os.makedirs(outdir)
+                todo = files
+                if engine == "add_lxid":
+                    todo = [f for f in todo if toolbox_io.file_iso(f) == "syn" or os.path.exists(
+                        os.path.join(dicpath, toolbox_io.file_iso(f) + "-Dictionary.txt"))]
+                try:
+                    rows = check(engine, todo, outdir)
+                except subprocess.CalledProcessError as error:
+                    print("{}: failed ({})".format(engine, error))
+                    failed += 1
+                    continue
+                bench.writerows(rows)
+                for row in rows:
+                    print("{}\t{}\t{} utterances\t{} MB/s\t{}".format(
+                        engine, row[2], row[4], row[6], "ok" if row[7] else row[8]))
+                    failed += not row[7]
+            if args.imports:
+                for module in modules:
+                    seconds = import_time(module)
+                    bench.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), "import", module,
+                                    "", "", round(seconds, 4), "", "", ""])
+                    print("import\t{}\t{:.3f} s".format(module, seconds))
+    print("results appended to", benchpath)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import io
+import pandas as pd
+import toolbox_io, compile_rules
+
+def test_compose_chains_rules_of_later_tables():
+    compiled, chains, report = compile_rules.compose([
+        ("a", {"ps": {("0001", "n"): "N"}}),
+        ("b", {"ps": {("0001", "N"): "noun", ("0002", "v"): "V"}}),
+    ])
+    # 'N' values already in the corpus are replaced by the second table too
+    assert compiled == {"ps": {("0001", "n"): "noun", ("0001", "N"): "noun", ("0002", "v"): "V"}}
+    assert chains["ps"][("0001", "n")] == ["n", "N", "noun"]
+    assert report == []
+
+def test_compose_keeps_the_rule_of_the_earlier_table():
+    # 'n' no longer occurs once the first table has replaced it
+    compiled, chains, report = compile_rules.compose([
+        ("a", {"ps": {("0001", "n"): "N"}}),
+        ("b", {"ps": {("0001", "n"): "X"}}),
+    ])
+    assert compiled["ps"] == {("0001", "n"): "N"}
+
+def test_compose_drops_and_reports_cycles():
+    compiled, chains, report = compile_rules.compose([
+        ("a", {"ps": {("0001", "n"): "N"}}),
+        ("b", {"ps": {("0001", "N"): "n"}}),
+    ])
+    # 'n' ends where it starts, 'N' already in the corpus still becomes 'n'
+    assert compiled["ps"] == {("0001", "N"): "n"}
+    assert report == ["cycle|\\ps|0001: n -> N -> n"]
+
+def test_table_rules_strips_values_and_reports_conflicts():
+    tdf = pd.DataFrame({"lxid": ["0001", "0001 ", "0002"],
+                        "old_ps": ["n", "n ", "v"],
+                        "new_ps": ["N", "X", None]})
+    rules, conflicts = compile_rules.table_rules(tdf, "t.xlsx")
+    assert rules == {"ps": {("0001", "n"): "N"}}
+    assert len(conflicts) == 1 and conflicts[0].startswith("conflict|t.xlsx|\\ps|0001 'n'")
+
+def test_replace_records_applies_compiled_rules():
+    text = "\\ref 1\n\\tx ka\n\\mb ka\n\\ps n\n\\lxid 0001\n\n"
+    compiled = {"ps": {("0001", "n"): "noun"}}
+    out = io.StringIO()
+    compile_rules.replace_records(io.StringIO(text), out, compiled)
+    ref = next(toolbox_io.iter_records(io.StringIO(out.getvalue())))
+    assert ref["\\ps"].split() == ["noun"]
@@ -0,0 +1,17 @@
+import corpus_diff
+
+def test_pair_paths_pairs_files_by_name(tmp_path):
+    old, new = tmp_path / "old", tmp_path / "new"
+    old.mkdir()
+    new.mkdir()
+    for name in ("kha-a.txt", "kha-b.txt.gz", "kha-c.txt"):
+        (old / name).write_bytes(b"")
+    for name in ("kha-a.txt", "kha-b.txt.gz", "kha-d.txt"):
+        (new / name).write_bytes(b"")
+    assert corpus_diff.pair_paths(str(old), str(new)) == [
+        (str(old / "kha-a.txt"), str(new / "kha-a.txt")),
+        (str(old / "kha-b.txt.gz"), str(new / "kha-b.txt.gz"))]
+
+def test_pair_paths_of_two_files(tmp_path):
+    old, new = tmp_path / "a.txt", tmp_path / "b.txt"
+    assert corpus_diff.pair_paths(str(old), str(new)) == [(str(old), str(new))]
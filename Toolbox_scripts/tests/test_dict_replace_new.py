@@ -0,0 +1,42 @@
+import pandas as pd
+import dict_replace_new
+
+DICTIONARY = (b"\\_sh v3.0  231  MDF 4.0\r\n\r\n"
+              b"\\lx adi\r\n\\lxid 12\r\n\\ps excl\r\n\\zz kept\r\n\\ge Hey\r\n\r\n"
+              b"\\lx adkar\r\n\\lxid 0013\r\n\\ps  v\r\n\\ge economize\r\n\\ps n\r\n\\ge thrift\r\n"
+              b"\r\n\\lx ai\r\n\\lxid 0014\r\n\\ps v\r\n\\ge give\r\n")
+
+def patch(tmp_path, rows, columns=("lxid", "ps", "old_ps", "new_ps")):
+    dfile, table, newpath = tmp_path / "kha-Dictionary.txt", tmp_path / "t.xlsx", tmp_path / "new.txt"
+    dfile.write_bytes(DICTIONARY)
+    pd.DataFrame(rows, columns=[columns[0], columns[2], columns[3]]).to_excel(str(table), index=False)
+    changed = dict_replace_new.patch_dictionary(str(dfile), str(table), str(newpath), list(columns))
+    return changed, newpath.read_bytes()
+
+def test_patch_changes_only_the_matching_lines(tmp_path):
+    changed, new = patch(tmp_path, [["0012", "excl", "EXCL"], ["0013", "n", "N"]])
+    assert changed == 2
+    assert new == DICTIONARY.replace(b"\\ps excl", b"\\ps EXCL").replace(b"\\ps n\r", b"\\ps N\r")
+
+def test_patch_keeps_the_spacing_after_the_marker(tmp_path):
+    changed, new = patch(tmp_path, [["0013", "v", "V"], ["0014", "v", "V"]])
+    assert changed == 2
+    assert b"\\ps  V\r\n\\ge economize" in new and b"\\ps V\r\n\\ge give" in new
+
+def test_patch_applies_rows_in_order(tmp_path):
+    changed, new = patch(tmp_path, [["0014", "v", "x"], ["0014", "x", "y"]])
+    assert b"\\ps y\r\n\\ge give" in new
+
+def test_patch_skips_rows_without_a_new_value(tmp_path):
+    changed, new = patch(tmp_path, [["0012", "excl", None], [" 0014 ", " v ", " V "]])
+    assert changed == 1
+    assert new == DICTIONARY.replace(b"\\ps v\r\n\\ge give", b"\\ps V\r\n\\ge give")
+
+def test_patch_by_lexeme(tmp_path):
+    changed, new = patch(tmp_path, [["adkar", "economize", "save"]], ("lx", "ge", "old_ge", "new_ge"))
+    assert changed == 1
+    assert new == DICTIONARY.replace(b"economize", b"save")
+
+def test_patch_without_changes_copies_the_file(tmp_path):
+    changed, new = patch(tmp_path, [["0099", "n", "N"]])
+    assert changed == 0 and new == DICTIONARY
@@ -0,0 +1,43 @@
+import frozen_rules
+
+COMPILED = {
+    "ps": {("0001", "n"): "noun", ("0002", "v"): "verb", ("0010", "n"): "N"},
+    "ge": {("0001", "head"): "hëad", ("0003", "xé"): ""},
+}
+
+def test_lookup_matches_the_compiled_rules(tmp_path):
+    path = str(tmp_path / "kha-rules.frozen")
+    frozen_rules.freeze(COMPILED, path, "lxid", ["cycle|\\ps|0004: a -> b -> a"])
+    assert frozen_rules.is_frozen(path)
+    with frozen_rules.FrozenRules(path) as rules:
+        assert rules.lex == "lxid"
+        assert rules.report == ["cycle|\\ps|0004: a -> b -> a"]
+        assert set(rules) == set(COMPILED)
+        for tier, trules in COMPILED.items():
+            assert len(rules[tier]) == len(trules)
+            assert dict(rules[tier].items()) == trules
+            for key, new in trules.items():
+                assert rules[tier].get(key) == new
+                assert key in rules[tier]
+
+def test_missing_keys(tmp_path):
+    path = str(tmp_path / "kha-rules.frozen")
+    frozen_rules.freeze(COMPILED, path)
+    with frozen_rules.FrozenRules(path) as rules:
+        # neighbours of existing keys in the sort order
+        for key in (("0001", "m"), ("0001", "nn"), ("0000", "n"), ("9999", "z"), ("0001", "")):
+            assert rules["ps"].get(key) is None
+            assert key not in rules["ps"]
+        assert rules["ge"].get(("0003", "xé")) == ""
+
+def test_empty_rules(tmp_path):
+    path = str(tmp_path / "empty.frozen")
+    frozen_rules.freeze({"ps": {}}, path)
+    with frozen_rules.FrozenRules(path) as rules:
+        assert len(rules["ps"]) == 0
+        assert rules["ps"].get(("0001", "n")) is None
+
+def test_other_files_are_not_frozen(tmp_path):
+    path = tmp_path / "kha-Texts.txt"
+    path.write_text("\\_sh v3.0\n")
+    assert not frozen_rules.is_frozen(str(path))
@@ -0,0 +1,85 @@
+import io
+import toolbox_io
+
+RECORD = """\\ref kha_001
+\\tx kaba  khlieh
+\\mb ka-  ba khlieh
+\\ge the- go head
+\\ps art- v  n
+\\lxid 0001 0002 0003
+
+"""
+
+def read_record(text):
+    return next(toolbox_io.iter_records(io.StringIO(text)))
+
+def test_build_words_groups_morphemes_by_word():
+    ref = read_record(RECORD)
+    words = toolbox_io.build_words(ref)
+    assert words == [("kaba", {"\\mb": ["ka-", "ba"], "\\ge": ["the-", "go"],
+                               "\\ps": ["art-", "v"], "\\lxid": ["0001", "0002"]}),
+                     ("khlieh", {"\\mb": ["khlieh"], "\\ge": ["head"],
+                                 "\\ps": ["n"], "\\lxid": ["0003"]})]
+    assert toolbox_io.check_words(ref, words, toolbox_io.utterance_tiers(ref)) is None
+
+def test_build_words_groups_lxid_like_mb():
+    ref = read_record("\\ref 1\n\\tx kaba\n\\mb ka- ba\n\\lxid 0001 0002\n")
+    words = toolbox_io.build_words(ref)
+    assert words == [("kaba", {"\\mb": ["ka-", "ba"], "\\lxid": ["0001", "0002"]})]
+
+def test_check_words_reports_mismatches():
+    ref = read_record("\\ref 1\n\\tx ka khlieh\n\\mb ka\n\\ge the\n")
+    words = toolbox_io.build_words(ref)
+    assert toolbox_io.check_words(ref, words, ("\\mb", "\\ge")) == "word numbers don't match"
+    ref = read_record("\\ref 1\n\\tx ka\n\\mb ka\n")
+    assert toolbox_io.check_words(ref, toolbox_io.build_words(ref), ("\\mb", "\\ge")) == "morpheme tiers missing"
+
+def test_align_words_pads_to_the_longest_unit():
+    words = [("ka", {"\\mb": ["ka"], "\\ge": ["the"]}),
+             ("khlieh", {"\\mb": ["khlieh"], "\\ge": ["head"]})]
+    aligned = toolbox_io.align_words(words, ("\\mb", "\\ge"))
+    assert aligned["\\tx"] == "ka  khlieh "
+    assert aligned["\\mb"] == "ka  khlieh "
+    assert aligned["\\ge"] == "the head   "
+
+def test_align_words_widens_the_last_unit_for_long_words():
+    aligned = toolbox_io.align_words([("kaba", {"\\mb": ["k", "b"]})], ("\\mb",))
+    assert aligned == {"\\tx": "kaba ", "\\mb": "k b  "}
+
+def test_align_words_counts_utf8_bytes():
+    aligned = toolbox_io.align_words([("aː", {"\\mb": ["a"]})], ("\\mb",))
+    assert aligned["\\mb"] == "a   "
+
+def test_write_record_round_trip():
+    ref = read_record(RECORD)
+    out = io.StringIO()
+    toolbox_io.write_record(out, ref)
+    assert out.getvalue() == RECORD
+
+def test_realigned_record_reads_back_the_same_words():
+    ref = read_record("\\ref 1\n\\tx ka khlieh\n\\mb ka khlieh\n\\ge the head\n\\ps art n\n")
+    words = toolbox_io.build_words(ref)
+    words[1][1]["\\ps"] = ["noun"]
+    out = io.StringIO()
+    toolbox_io.write_record(out, ref, words)
+    assert out.getvalue().splitlines()[1:5] == [
+        "\\tx ka  khlieh", "\\mb ka  khlieh", "\\ge the head", "\\ps art noun"]
+    assert toolbox_io.build_words(read_record(out.getvalue())) == words
+
+def test_write_record_orders_tiers():
+    ref = read_record("\\ref 1\n\\ft free\n\\tx ka\n\\xx other\n\\ELANBegin 1.0\n")
+    out = io.StringIO()
+    toolbox_io.write_record(out, ref)
+    assert out.getvalue() == "\\ref 1\n\\ELANBegin 1.0\n\\tx ka\n\\ft free\n\\xx other\n\n"
+
+def test_notes_keep_their_own_lines():
+    ref = read_record("\\ref 1\n\\nt one \n\\nt two\n")
+    assert ref["\\nt"] == "one\n\\nt two"
+
+def test_compressed_files_round_trip(tmp_path):
+    for name in ("a.txt", "a.txt.gz", "a.txt.xz"):
+        path = str(tmp_path / name)
+        with toolbox_io.open_output(path) as tbwrite:
+            toolbox_io.write_record(tbwrite, read_record(RECORD))
+        with toolbox_io.open_corpus(path) as tfile:
+            assert tfile.read() == RECORD
@@ -0,0 +1,167 @@
+"""
+An index of the utterances of a corpus file by their time in the recording
+(\\ELANBegin and \\ELANEnd), per participant (\\ELANParticipant), to find all
+utterances of a speaker in a time window without reading the whole file:
+
+    index = TimeIndex.from_file("Corpus_files/kha-Texts_test.txt")
+    for textid, ref in index.utterances(120, 300, participant="AB"):
+        print(ref["\\ref"], ref["\\tx"])
+
+For every participant the begin times are kept in a sorted list with the end
+times and the byte offsets of the records in the same order, so a query is a
+binary search (bisect) plus a scan over the utterances that begin in the
+window or at most the longest utterance duration before it. The records that
+are found are read from their offsets.
+
+Usage (from the Toolbox_scripts folder):
+    python time_index.py Corpus_files/kha-Texts_test.txt 120 300 [--participant AB]
+
+Assumptions:
+    - Times are in seconds, utterances without both times are not indexed
+    - An utterance is in a window if it overlaps with it
+    - The offsets are positions in the (decompressed) file, so queries on
+    compressed files are slower
+"""
+import sys, argparse
+from bisect import bisect_left
+import toolbox_io
+
+# the lines that begin a record, see toolbox_io.iter_records
+record_starts = (b"\\_sh", b"\\id", b"\\ref")
+
+def parse_time(value):
+    """Return a time in seconds from the bytes of an ELAN tier, or None."""
+    try:
+        return float(value.strip())
+    except ValueError:
+        return None
+
+class TimeIndex(object):
+    """Index of the utterances of a corpus file by time and participant."""
+
+    def __init__(self, path, utterances):
+        """Build the index.
+
+        path (str): the corpus file
+        utterances (iterable): (begin, end, participant, offset, textid offset)
+        tuples of the utterances
+        """
+        self.path = path
+        self.encoding = toolbox_io.corpus_encoding(path)
+        # participant -> (begins, ends, offsets, textid offsets), all sorted by begin
+        self.participants = {}
+        # participant -> longest duration of an utterance
+        self.longest = {}
+        rows = {}
+        for row in utterances:
+            # every utterance is in the index of its participant and of all (None)
+            for participant in (row[2], None):
+                rows.setdefault(participant, []).append(row)
+        for participant, prows in rows.items():
+            prows.sort()
+            begins, ends, names, offsets, textids = (list(col) for col in zip(*prows))
+            self.participants[participant] = (begins, ends, offsets, textids)
+            self.longest[participant] = max(e - b for b, e in zip(begins, ends))
+
+    @classmethod
+    def from_file(cls, path):
+        """Build the index of a corpus file with one pass over its bytes."""
+        utterances = []
+        record, offset, textid = None, 0, None
+        with toolbox_io.open_binary(path) as tbfile:
+            for line in tbfile:
+                if line.startswith(record_starts):
+                    if record and record[0] is not None and record[1] is not None:
+                        utterances.append(tuple(record))
+                    record = None
+                    if line.startswith(b"\\id"):
+                        textid = offset
+                    elif line.startswith(b"\\ref"):
+                        # begin, end, participant, offset, offset of the \id record
+                        record = [None, None, "", offset, textid]
+                elif record is not None:
+                    if line.startswith(b"\\ELANBegin"):
+                        record[0] = parse_time(line[10:])
+                    elif line.startswith(b"\\ELANEnd"):
+                        record[1] = parse_time(line[8:])
+                    elif line.startswith(b"\\ELANParticipant"):
+                        record[2] = line[16:].strip().decode("utf-8", "replace")
+                offset += len(line)
+            if record and record[0] is not None and record[1] is not None:
+                utterances.append(tuple(record))
+        return cls(path, utterances)
+
+    def query(self, start, end, participant=None):
+        """Return the (begin, end, offset, textid offset) of the utterances that
+        overlap with the window from start to end, in order of their begin time.
+
+        start, end (float): the window in seconds
+        participant (str): only utterances of this participant, default all
+        """
+        if participant not in self.participants:
+            return []
+        begins, ends, offsets, textids = self.participants[participant]
+        # utterances that overlap begin after start - the longest duration
+        first = bisect_left(begins, start - self.longest[participant])
+        last = bisect_left(begins, end)
+        return [(begins[i], ends[i], offsets[i], textids[i])
+                for i in range(first, last) if ends[i] > start and begins[i] < end]
+
+    def read_record(self, tbfile, offset):
+        """Read and parse the record at an offset of the open (binary) corpus file."""
+        tbfile.seek(offset)
+        lines = [tbfile.readline()]
+        for line in tbfile:
+            if line.startswith(record_starts):
+                break
+            lines.append(line)
+        return next(toolbox_io.iter_records(l.decode(self.encoding) for l in lines))
+
+    def utterances(self, start, end, participant=None):
+        """Iterate and yield (text id, utterance) for the utterances in a window,
+        like toolbox_io.iter_utterances.
+
+        start, end (float): the window in seconds
+        participant (str): only utterances of this participant, default all
+        """
+        hits = self.query(start, end, participant)
+        with toolbox_io.open_binary(self.path) as tbfile:
+            for begin, end, offset, textid in hits:
+                text = self.read_record(tbfile, textid)["\\id"].strip() if textid is not None else ""
+                yield text, self.read_record(tbfile, offset)
+
+def in_window(ref, start=None, end=None, participant=None):
+    """Check whether an utterance overlaps with a time window and is by a participant.
+
+    Utterances without times are only in the window if no start or end is given.
+
+    ref (hash): the utterance
+    start, end (float): the window in seconds, None for no limit
+    participant (str): the participant, None for all
+    """
+    if participant is not None and ref.get("\\ELANParticipant", "").strip() != participant:
+        return False
+    if start is None and end is None:
+        return True
+    try:
+        begin, finish = float(ref["\\ELANBegin"]), float(ref["\\ELANEnd"])
+    except (KeyError, ValueError):
+        return False
+    return (start is None or finish > start) and (end is None or begin < end)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the utterances of a corpus file in a time window.")
+    parser.add_argument("corpus", help="the corpus file")
+    parser.add_argument("start", type=float, help="the start of the window in seconds")
+    parser.add_argument("end", type=float, help="the end of the window in seconds")
+    parser.add_argument("--participant", help="only utterances of this participant")
+    args = parser.parse_args(argv)
+
+    index = TimeIndex.from_file(args.corpus)
+    for textid, ref in index.utterances(args.start, args.end, args.participant):
+        sys.stdout.write("{}\t{}\t{}\t{}\t{}\t{}\n".format(
+            textid, ref["\\ref"].strip(), ref.get("\\ELANBegin", "").strip(), ref.get("\\ELANEnd", "").strip(),
+            ref.get("\\ELANParticipant", "").strip(), ref.get("\\tx", "").strip()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Script loads Toolbox corpus files into a token table (see export_tokens.py),
+applies a replacement table to it as one merge on (lxid, old value) per tier,
+and writes the corpus files back to Toolbox format. Instead of looking up every
+morpheme in a dict, like the replacement scripts do, each tier is replaced for
+all files at once with a join.
+
+Usage (from the Toolbox_scripts folder):
+    python token_replace.py Dictionaries/kha-replacetable.xlsx --tiers ps ge
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder, replacement tables have columns
+    'lxid', 'old_<tier>' and 'new_<tier>', and corpus files and tables begin
+    with the same ISO code, like in the replacement scripts
+    - New corpus files are written to the 'wripath' folder, utterances without
+    alignment errors are realigned like write_file does: widths in UTF-8
+    bytes, one whitespace between units, and \\tx padded to the unit group
+"""
+import os, argparse
+import toolbox_io
+from export_tokens import iter_tokens, columns
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+wripath = "Output_files/"# path for new Toolbox corpus files
+
+def load_tokens(files):
+    """Return the tokens of corpus files as a pandas DataFrame.
+
+    files (list): the corpus files
+    """
+    import pandas as pd
+
+    rows = []
+    for tbpath in files:
+        rows.extend(iter_tokens(tbpath, tbpath))
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+def replace_tokens(tokens, tdf, tier, lex="lxid", old=None, new=None):
+    """Replace values of a tier in the token table, returns the no. of changes.
+
+    tokens (DataFrame): the token table, changed in place
+    tdf (DataFrame): the replacement table
+    tier (str): the tier to replace, i.e. 'ps'
+    lex (str): the column identifying the item, 'lxid' or 'lx' (matched on mb)
+    old, new (str): the columns with old and new values, if not old_<tier>
+    and new_<tier>
+    """
+    key = "lxid" if lex == "lxid" else "mb"
+    old = old or "old_" + tier
+    new = new or "new_" + tier
+
+    # one rule per (item, old value), the first row wins like in get_repdict;
+    # the values are stripped as in compile_rules.table_rules
+    rules = tdf[[lex, old, new]].dropna(subset=[lex, old, new])
+    rules = rules.apply(lambda col: col.str.strip())
+    rules = rules.drop_duplicates([lex, old])
+    rules.columns = [key, tier, "_new"]
+    # a left merge keeps the order and number of the token rows
+    merged = tokens[[key, tier]].merge(rules, how="left", on=[key, tier])
+    changed = (merged["_new"].notna() & (merged["_new"] != merged[tier])).to_numpy()
+    tokens.loc[changed, tier] = merged.loc[changed, "_new"].to_numpy()
+    return int(changed.sum())
+
+def write_corpus(tbpath, outpath, tokens):
+    """Write a corpus file back with the (replaced) values of the token table.
+
+    tbpath (str): the original corpus file, for all other tiers
+    outpath (str): the new corpus file
+    tokens (DataFrame): the token rows of this file, in their original order
+    """
+    tiers = ("mb", "ph", "ge", "ps", "lxid")
+    # plain lists are much faster to walk through than DataFrame rows
+    utt = tokens["utterance"].tolist()
+    wrd = tokens["word"].tolist()
+    txs = tokens["tx"].tolist()
+    values = {tier: tokens[tier].tolist() for tier in tiers}
+
+    i = 0
+    with toolbox_io.open_corpus(tbpath) as tfile, toolbox_io.open_output(outpath) as tbwrite:
+        utterance = -1
+        for ref in toolbox_io.iter_records(tfile):
+            if "\\ref" not in ref:
+                toolbox_io.write_record(tbwrite, ref)
+                continue
+            utterance += 1
+            # only realign utterances without errors, like the replacement scripts
+            reftiers = toolbox_io.utterance_tiers(ref)
+            error = toolbox_io.check_words(ref, toolbox_io.build_words(ref), reftiers)
+
+            # rebuild the words of this utterance from its token rows
+            words = []
+            while i < len(utt) and utt[i] == utterance:
+                if not words or wrd[i] != len(words) - 1:
+                    words.append((txs[i], {t: [] for t in reftiers}))
+                for tier in reftiers:
+                    words[-1][1][tier].append(values[tier[1:]][i])
+                i += 1
+
+            if error:
+                toolbox_io.write_record(tbwrite, ref)
+            else:
+                toolbox_io.write_record(tbwrite, ref, words, reftiers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replace items in Toolbox corpus files with a token table join.")
+    parser.add_argument("table", help="the replacement table (XLSX)")
+    parser.add_argument("--tiers", nargs="+", default=["ps"], help="the tiers to replace, i.e. ps ge")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--output", default=wripath, help="folder for the new corpus files")
+    args = parser.parse_args(argv)
+
+    # corpus files in the language of the replacement table
+    iso = toolbox_io.file_iso(args.table)
+    files = [f for f in toolbox_io.corpus_files(args.corpus) if toolbox_io.file_iso(f) == iso]
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    tokens = load_tokens(files)
+    tdf = toolbox_io.read_reptable(args.table, args.lex)
+    for tier in args.tiers:
+        print("\\{}: {} morphemes changed".format(tier, replace_tokens(tokens, tdf, tier, args.lex)))
+
+    groups = dict(list(tokens.groupby("file", sort=False)))
+    for tbpath in files:
+        outpath = os.path.join(args.output, os.path.basename(tbpath))
+        write_corpus(tbpath, outpath, groups.get(tbpath, tokens.iloc[0:0]))
+        print(outpath)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+One entry point for the replacement scripts, so that they do not have to be
+remembered by file name:
+    python toolbox.py replace-corpus           # replace_Toolbox_texts.py
+    python toolbox.py replace-dict [...]       # dict_replace_new.py
+    python toolbox.py check-terms [...]        # check_terms.py
+    python toolbox.py replace-excel [...]      # replace_Excel_texts.py
+The options after the command are those of the script, e.g.
+    python toolbox.py replace-dict --help
+
+Only the script of the command is imported, and the scripts import pandas and
+the other large libraries only where they are used, so that a command (or its
+--help) starts quickly. See roundtrip_check.py for the import times.
+
+Usage (from the Toolbox_scripts folder, as the scripts themselves):
+    python toolbox.py <command> [options]
+"""
+import sys, argparse, importlib
+
+# the commands and the scripts that run them
+commands = {
+    "replace-corpus": ("replace_Toolbox_texts", "replace items in the corpus files"),
+    "replace-dict": ("dict_replace_new", "replace items in the dictionaries"),
+    "check-terms": ("check_terms", "write spreadsheets of the dictionary terms by part of speech"),
+    "replace-excel": ("replace_Excel_texts", "replace items in exported spreadsheets"),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a replacement script.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="\n".join("{}: {}".format(c, d) for c, (m, d) in commands.items()))
+    parser.add_argument("command", choices=list(commands))
+    parser.add_argument("options", nargs=argparse.REMAINDER, help="the options of the script")
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(commands[args.command][0])
+    # some scripts return the files they wrote, which is not an exit status
+    status = module.main(args.options)
+    return status if isinstance(status, int) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Script replaces items in a Toolbox text read from standard input and writes
+the new text to standard output, one record at a time, so that replacement
+steps can be chained in a shell pipeline without temporary files and with
+memory use that does not grow with the size of the text:
+
+    zcat kha-text.txt.gz \\
+        | python toolbox_filter.py Dictionaries/kha-pos.xlsx --tier ps \\
+        | python toolbox_filter.py Dictionaries/kha-gloss.xlsx --tier ge \\
+        | gzip > Output_files/kha-text.txt.gz
+
+The replacement tables are compiled with compile_rules.py, so one filter can
+also apply several tables (and tiers) in a single pass. Conflicts and cycles
+in the tables, and the number of changes, are reported on standard error.
+Instead of the tables, a frozen rules file (see frozen_rules.py) can be
+given, which is opened without reading Excel or compiling anything:
+
+    python frozen_rules.py Dictionaries/kha-pos.xlsx Dictionaries/kha-gloss.xlsx
+    cat kha-text.txt | python toolbox_filter.py Output_files/kha-rules.frozen > new.txt
+
+Assumptions:
+    - The input is UTF-8 (use --encoding otherwise), the output is UTF-8
+    - Records are realigned like in the other replacement scripts, utterances
+    with alignment errors are written unchanged
+    - With --start, --end and/or --participant only the utterances of a
+    participant that overlap with a time window (in seconds, from \\ELANBegin
+    and \\ELANEnd) are replaced, the others are written unchanged
+"""
+import io, sys, argparse
+import compile_rules, frozen_rules, time_index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replace items in a Toolbox text from stdin to stdout.")
+    parser.add_argument("tables", nargs="+", help="the replacement tables, in the order they apply, or a frozen rules file")
+    parser.add_argument("--tier", action="append",
+                        help="only replace this tier, i.e. ps (can be repeated, default all tiers of the tables)")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"),
+                        help="the column identifying the items (a frozen rules file has its own)")
+    parser.add_argument("--encoding", default="utf-8", help="the encoding of the input")
+    parser.add_argument("--start", type=float, help="only replace utterances that end after this time")
+    parser.add_argument("--end", type=float, help="only replace utterances that begin before this time")
+    parser.add_argument("--participant", help="only replace utterances of this participant")
+    parser.add_argument("--strict", action="store_true", help="don't replace anything if the tables have problems")
+    args = parser.parse_args(argv)
+
+    if len(args.tables) == 1 and frozen_rules.is_frozen(args.tables[0]):
+        compiled = frozen_rules.FrozenRules(args.tables[0])
+        report, args.lex = compiled.report, compiled.lex
+    else:
+        compiled, chains, report = compile_rules.load_rules(args.tables, args.lex)
+    for line in report:
+        sys.stderr.write(line + "\n")
+    if args.tier:
+        for tier in args.tier:
+            if tier not in compiled:
+                sys.stderr.write("no rules for tier \\{} in the tables\n".format(tier))
+        compiled = {tier: rules for tier, rules in compiled.items() if tier in args.tier}
+    if report and args.strict:
+        sys.stderr.write("not applied because of --strict\n")
+        return 1
+
+    # read and write the raw streams, so that the encodings don't depend on the locale
+    lines = io.TextIOWrapper(sys.stdin.buffer, encoding=args.encoding)
+    tbwrite = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="\n")
+    select = None
+    if args.start is not None or args.end is not None or args.participant is not None:
+        select = lambda ref: time_index.in_window(ref, args.start, args.end, args.participant)
+    try:
+        n_changes = compile_rules.replace_records(lines, tbwrite, compiled, args.lex, select=select)
+        tbwrite.flush()
+    except BrokenPipeError:
+        # the next step of the pipeline stopped reading
+        return 1
+    sys.stderr.write("{} changes\n".format(n_changes))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
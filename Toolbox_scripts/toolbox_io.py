@@ -0,0 +1,419 @@
+"""
+Functions shared by the corpus tools for reading and writing interlinearized
+Toolbox files. They follow the same rules as the replacement scripts
+(`replace_Toolbox_texts.py` and `Toolbox_tier_scripts/`), but keep no global
+state, so they can be imported by other scripts without side effects.
+
+    Utterances are returned as ordered dicts with the field marker as key and the
+    tier content as value, words as a list of tuples:
+    [(word1, {"\\mb": [mb1, mb2]
+              "\\ge": [ge1, ge2],
+              "\\ps": [ps1, ps2]}),
+     (word2, {...})]
+"""
+import io, os, re, gzip, lzma, glob, locale
+from collections import OrderedDict
+
+# instantiate regex to extract the field marker and its data from a line
+extract = re.compile(r"(\\\w+)\s*(.*)")
+# instantiate regex for extracting morphemes per word (aka m-words)
+mwords = re.compile(r"((\S+(\s+[=-]\s+|[=-]\s+))+(\S+(\s+[=-]|)+|\s+\S+)|\S+)")
+
+# the morpheme tiers that are split into morphemes and aligned
+MORPHEME_TIERS = ("\\mb", "\\ph", "\\ge", "\\ps", "\\lxid")
+# the order in which tiers are written back to a file, any other tier is
+# written after these in the order it was read
+TIER_ORDER = ("\\_sh", "\\id", "\\ref", "\\sound", "\\ELANBegin", "\\ELANEnd",
+              "\\ELANParticipant", "\\tx", "\\mb", "\\ph", "\\ge", "\\ps",
+              "\\lxid", "\\ft", "\\nt", "\\media", "\\ELANMediaURL",
+              "\\ELANMediaMIME")
+
+# compressed files, recognized by their extension or their first bytes
+COMPRESSIONS = ((".gz", b"\x1f\x8b"), (".xz", b"\xfd7zXZ\x00"), (".zst", b"\x28\xb5\x2f\xfd"))
+# the corpus file names the tools look for
+CORPUS_PATTERNS = ("*.txt",) + tuple("*.txt" + ext for ext, magic in COMPRESSIONS)
+
+def compression(path):
+    """Return the compression of a file ('.gz', '.xz', '.zst') or None.
+
+    The extension decides, files without one of these extensions that exist
+    are recognized by their first bytes.
+
+    path (str): the file to check
+    """
+    for ext, magic in COMPRESSIONS:
+        if path.endswith(ext):
+            return ext
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            start = f.read(6)
+        for ext, magic in COMPRESSIONS:
+            if start.startswith(magic):
+                return ext
+    return None
+
+def zstd_module():
+    """Return the zstd module (zstandard, or compression.zstd in Python 3.14)."""
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise ImportError("zstandard is needed to read and write .zst files")
+
+def open_binary(path, mode="rb"):
+    """Open a file in binary mode, (de)compressing it if necessary.
+
+    path (str): the file to open
+    mode (str): 'rb' or 'wb', for writing the compression is given by the extension
+    """
+    kind = compression(path) if "r" in mode else next(
+        (ext for ext, magic in COMPRESSIONS if path.endswith(ext)), None)
+    if kind == ".gz":
+        return gzip.open(path, mode)
+    if kind == ".xz":
+        return lzma.open(path, mode)
+    if kind == ".zst":
+        zstd = zstd_module()
+        if hasattr(zstd, "ZstdFile"):
+            return zstd.ZstdFile(path, mode)
+        if "r" in mode:
+            return io.BufferedReader(zstd.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+        return zstd.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+    return open(path, mode)
+
+def detect_encoding(path):
+    """Guess the encoding of a (decompressed) file, falling back to UTF-8.
+
+    path (str): the file to check
+    """
+    try:
+        from chardet.universaldetector import UniversalDetector
+    except ImportError:
+        return "utf-8"
+
+    detector = UniversalDetector()
+    # read (some) lines in binary mode to detect encoding
+    with open_binary(path) as f:
+        for line in f:
+            detector.feed(line)
+            if detector.done:
+                break
+    detector.close()
+
+    # ascii is a subset of utf-8, which is used for everything we write
+    encoding = detector.result["encoding"]
+    if encoding is None or encoding.lower() == "ascii":
+        return "utf-8"
+    return encoding
+
+def corpus_encoding(path, detect=False):
+    """Return the encoding a corpus file is read with.
+
+    path (str): the file to read
+    detect (bool): guess the encoding with chardet instead of using the default
+    encoding of open(), as the corpus scripts always did
+    """
+    if detect:
+        return detect_encoding(path)
+    return locale.getpreferredencoding(False)
+
+def open_corpus(path, detect=False):
+    """Open a (compressed) Toolbox file for reading.
+
+    path (str): the file to open
+    detect (bool): guess the encoding of the file, see corpus_encoding
+    """
+    return io.TextIOWrapper(open_binary(path), encoding=corpus_encoding(path, detect))
+
+def open_output(path):
+    """Open a file for writing UTF-8 text, compressed if the name ends in .gz, .xz or .zst.
+
+    path (str): the file to write
+    """
+    return io.TextIOWrapper(open_binary(path, "wb"), encoding="utf-8")
+
+def corpus_files(corpath):
+    """Return the (compressed) Toolbox files in a folder in sorted order.
+
+    corpath (str): the folder with the corpus files
+    """
+    return sorted(set(path for pattern in CORPUS_PATTERNS
+                      for path in glob.glob(os.path.join(corpath, pattern))))
+
+def file_iso(path):
+    """Return the ISO code a file name begins with, i.e. 'kha' for kha-Texts.txt"""
+    return os.path.basename(path).split("-")[0]
+
+def read_reptable(repfile, lex="lxid"):
+    """Read a replacement table (XLSX) with all values as strings.
+
+    lxid values are padded to four digits, like get_repdict does.
+
+    repfile (str): the replacement table
+    lex (str): the column identifying the item, 'lxid' or 'lx'
+    """
+    import pandas as pd
+
+    tdf = pd.read_excel(repfile, dtype=str)
+    if lex == "lxid" and lex in tdf:
+        tdf[lex] = tdf[lex].str.strip().str.zfill(4)
+    return tdf
+
+def add_tier(dictionary, line):
+    """Extract label and data and add to a hash.
+
+    dictionary (hash): some hash where data is added to
+    line (str): tier
+    """
+    # extract field marker label and its data
+    match = extract.match(line)
+    label = match.group(1)
+    data = match.group(2)
+    # check if there are several defintions of the
+    # same fieldmarker in one \ref
+    if label in dictionary:
+        # concatenate with hash content, keeping notes on their own lines
+        if label == "\\nt":
+            dictionary[label] = dictionary[label].rstrip() + "\n\\nt " + data
+        else:
+            dictionary[label] += " " + data
+    else:
+        # add to hash
+        dictionary[label] = data
+
+def iter_records(lines):
+    """Iterate and yield all records of a Toolbox file.
+
+    A record starts with a \\_sh, \\id or \\ref line, so the file header and
+    the text ids are yielded as records of their own.
+
+    lines (iterable): the lines of a Toolbox file
+    """
+    ref = OrderedDict()
+
+    # go through all data from a corpus file
+    # and save data per record under ref
+    for line in lines:
+
+        # throw away the newline (and carriage return) at the end of a line
+        line = line.rstrip("\r\n")
+
+        # if a new record starts
+        if line.startswith(("\\_sh", "\\id", "\\ref")):
+            # yield data of previous record
+            if ref:
+                yield ref
+            ref = OrderedDict()
+            add_tier(ref, line)
+
+        # if any other field marker starts
+        elif line.startswith("\\"):
+            add_tier(ref, line)
+
+        # if line does not start with \\, its data must belong
+        # to the fieldmarker that directly comes before
+        elif line.strip() and ref:
+            # get last added fieldmarker
+            label = next(reversed(ref))
+            # concatenate content
+            ref[label] += " " + line
+
+    # last record
+    if ref:
+        yield ref
+
+def iter_entries(lines):
+    """Iterate and yield the entries of a Toolbox (MDF) dictionary.
+
+    Every entry starts with a \\lx line and is yielded as a list of
+    (marker, value) tuples in the order of the file, the header before the
+    first entry is skipped.
+
+    lines (iterable): the lines of a Toolbox dictionary
+    """
+    entry = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("\\"):
+            match = extract.match(line)
+            if match.group(1) == "\\lx":
+                if entry and entry[0][0] == "\\lx":
+                    yield entry
+                entry = []
+            entry.append((match.group(1), match.group(2).rstrip()))
+        # lines without a marker continue the value of the last field
+        elif line.strip() and entry:
+            marker, value = entry[-1]
+            entry[-1] = (marker, value + " " + line.strip())
+    if entry and entry[0][0] == "\\lx":
+        yield entry
+
+def entry_fields(entry):
+    """Return the first value of every marker of a dictionary entry as a dict."""
+    fields = {}
+    for marker, value in entry:
+        fields.setdefault(marker, value)
+    return fields
+
+def iter_utterances(lines):
+    """Iterate and yield (text id, utterance) for all \\ref records.
+
+    lines (iterable): the lines of a Toolbox file
+    """
+    textid = ""
+    for ref in iter_records(lines):
+        if "\\id" in ref:
+            textid = ref["\\id"].strip()
+        if "\\ref" in ref:
+            yield textid, ref
+
+def build_words(ref, tiers=MORPHEME_TIERS):
+    """Build words and morphemes from tiers of an utterance.
+
+    ref (hash): the utterance
+    tiers (tuple): the morpheme tiers to split into morphemes
+    """
+    words = []
+    if "\\tx" in ref:
+        # extract words splitting the line at whitespaces
+        for word in re.finditer(r"\S+", ref["\\tx"]):
+            words.append((word.group(), {}))
+
+    # go through every morpheme type tier
+    for tier in tiers:
+        if tier not in ref:
+            continue
+
+        # \lxid values have no clitic/affix markers (= and -) to group them
+        # into m-words, so they are grouped like the morphemes of \mb
+        if tier == "\\lxid" and words and all("\\mb" in m for w, m in words):
+            units = ref[tier].split()
+            if len(units) == sum(len(m["\\mb"]) for w, m in words):
+                for word, morphemes in words:
+                    morphemes[tier], units = units[:len(morphemes["\\mb"])], units[len(morphemes["\\mb"]):]
+                continue
+
+        # go over the m-words of this tier
+        for i, mword in enumerate(mwords.finditer(ref[tier])):
+            # extract morphemes of this word splitting at whitespaces
+            morphemes = re.split(r"\s+", mword.group())
+
+            try:
+                # add morphemes to the right word (via index)
+                # under the right morpheme tier
+                words[i][1][tier] = morphemes
+
+            # if there are less w-words than m-words
+            except IndexError:
+                # add it under an empty word
+                words.append(("", {tier: morphemes}))
+
+    return words
+
+def utterance_tiers(ref, tiers=MORPHEME_TIERS):
+    """Return the morpheme tiers that occur in an utterance."""
+    return tuple(tier for tier in tiers if tier in ref)
+
+def check_words(ref, words, tiers=MORPHEME_TIERS):
+    """Do various checks for the words and their morphemes.
+
+    Returns a description of the first problem found, or None.
+
+    ref (hash): the utterance
+    words (list): the words built from the utterance
+    tiers (tuple): the morpheme tiers the utterance should have
+    """
+    if not tiers:
+        return "morpheme tiers missing"
+
+    # check if morpheme tiers are missing or empty
+    for field in ("\\tx",) + tuple(tiers):
+        # check if morpheme tier occurs
+        if field not in ref:
+            return "morpheme tiers missing"
+        # check if morpheme field is empty
+        if not ref[field].strip():
+            return "morpheme tiers empty"
+
+    # Check if there are words in the utterance at all
+    if not words:
+        return "no words"
+
+    # do checks for word and morpheme numbers
+    for word, morphemes in words:
+        # if number of words and morpheme groups do not match
+        if not word or len(morphemes) != len(tiers):
+            return "word numbers don't match"
+
+        # if number of morphemes is not equal for all morpheme tiers
+        # take number of \mb's as a random reference point
+        n_units = len(morphemes[tiers[0]])
+        for tier in morphemes:
+            if len(morphemes[tier]) != n_units:
+                return "morpheme numbers don't match"
+
+    return None
+
+def align_words(words, tiers):
+    """Build aligned tier content from words and their morphemes.
+
+    Widths are counted in UTF-8 bytes, there is one whitespace between units
+    and \\tx is padded to the width of the unit group. If a word is longer than
+    its unit group, the last unit of the group is widened to fit it.
+
+    words (list): the words of an utterance
+    tiers (tuple): the morpheme tiers to write
+    """
+    aligned = OrderedDict((tier, []) for tier in ("\\tx",) + tuple(tiers))
+    for word, morphemes in words:
+        txlen = len(word.encode("utf-8"))
+        n_units = len(morphemes[tiers[0]])
+
+        # keep track of the longest unit group
+        longest_group = 0
+        # go through each slot in the word (e.g. via \mb)
+        for i in range(n_units):
+            # save the no. of chars for every unit in this slot
+            lens = {tier: len(morphemes[tier][i].encode("utf-8")) for tier in tiers}
+            # there is one whitespace between morphemes/words
+            longest_unit = max(lens.values()) + 1
+            # widen the last unit if the word does not fit the group
+            if i == n_units - 1 and longest_group + longest_unit < txlen + 1:
+                longest_unit = txlen + 1 - longest_group
+            longest_group += longest_unit
+
+            # add morphemes with the necessary whitespaces
+            for tier in tiers:
+                aligned[tier].append(morphemes[tier][i] + (longest_unit - lens[tier]) * " ")
+        # add necessary whitespaces after the word
+        aligned["\\tx"].append(word + (longest_group - txlen) * " ")
+
+    return OrderedDict((tier, "".join(units)) for tier, units in aligned.items())
+
+def write_record(new_file, ref, words=None, tiers=None):
+    """Write a record to a file.
+
+    new_file (file): the file to write to
+    ref (hash): the record
+    words (list): if given, the morpheme tiers are realigned from these words
+    tiers (tuple): the morpheme tiers to realign, defaults to those in ref
+    """
+    if words is not None:
+        if tiers is None:
+            tiers = utterance_tiers(ref)
+        ref = OrderedDict(ref)
+        ref.update(align_words(words, tiers))
+
+    # Go through every known tier in the right order, then all others
+    for tier in TIER_ORDER + tuple(t for t in ref if t not in TIER_ORDER):
+        # write tier if it occurs in the record
+        if tier in ref:
+            new_file.write(tier + " " + ref[tier].rstrip() + "\n")
+
+    # insert empty line between records
+    new_file.write("\n")
@@ -0,0 +1,166 @@
+"""
+Script watches the corpus files and replacement tables and replaces items in a
+corpus file as soon as it is saved, so that the normalized version in the
+'wripath' folder is always up to date while annotators are working.
+
+The folders are polled every few seconds, which works on every system and on
+shared drives. A file is only processed once it has not changed for 'delay'
+seconds, so that a file that is still being saved (or saved several times in a
+row) is processed once. When a corpus file changes, only that file is
+processed; when a replacement table changes, its rules are compiled again and
+all corpus files of its ISO code are processed, as they are when a table is
+removed. The compiled rules of every language stay in memory between changes.
+
+Usage (from the Toolbox_scripts folder):
+    python watch_corpus.py
+    python watch_corpus.py --once     # bring the output up to date and stop
+
+Assumptions:
+    - Corpus files are in the 'corpath' folder, replacement tables are the
+    'dicpath'/<iso>-replacetable*.xlsx files, compiled in the order of their
+    names (see compile_rules.py), with old_xx/new_xx columns and an lxid column
+    - At the start, corpus files whose output is missing or older than the file
+    or its tables are processed
+"""
+import os, sys, glob, time, argparse, traceback
+import toolbox_io, compile_rules
+
+# set the paths where files will be read/written
+corpath = "Corpus_files/"# path for Toolbox corpus files
+dicpath = "Dictionaries/"# path for replacement tables
+wripath = "Output_files/"# path for new Toolbox corpus files
+
+def stamp(message):
+    """Print a message with the time."""
+    print(time.strftime("%H:%M:%S"), message, flush=True)
+
+def snapshot(paths):
+    """Return {path: (mtime, size)} of files."""
+    result = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        result[path] = (stat.st_mtime, stat.st_size)
+    return result
+
+class Watcher(object):
+    """Keeps the compiled rules of every language and the state of the files."""
+
+    def __init__(self, corpath=corpath, dicpath=dicpath, wripath=wripath, lex="lxid", delay=2.0):
+        self.corpath, self.dicpath, self.wripath = corpath, dicpath, wripath
+        self.lex, self.delay = lex, delay
+        self.rules = {}# iso -> (table snapshot, compiled rules)
+        self.seen = {}# path -> (mtime, size) when it was last processed
+        self.pending = {}# path -> (mtime, size, time the change was first seen)
+
+    def tables(self, iso=None):
+        """Return the replacement tables, of one language or all."""
+        return sorted(glob.glob(os.path.join(self.dicpath, (iso or "*") + "-replacetable*.xlsx")))
+
+    def compiled(self, iso):
+        """Return the compiled rules of a language, compiling them again if a table changed."""
+        tables = self.tables(iso)
+        state = snapshot(tables)
+        if iso not in self.rules or self.rules[iso][0] != state:
+            compiled, chains, report = compile_rules.load_rules(tables, self.lex) if tables else ({}, [], [])
+            for line in report:
+                stamp("{}: {}".format(iso, line))
+            stamp("{}: {} rules from {} tables".format(
+                iso, sum(len(r) for r in compiled.values()), len(tables)))
+            self.rules[iso] = (state, compiled)
+        return self.rules[iso][1]
+
+    def process(self, tbpath):
+        """Replace items in a corpus file and write it to 'wripath'."""
+        outpath = os.path.join(self.wripath, os.path.basename(tbpath))
+        try:
+            compiled = self.compiled(toolbox_io.file_iso(tbpath))
+            changes = compile_rules.replace_file(tbpath, outpath, compiled, self.lex)
+            stamp("{}: {} changes".format(outpath, changes))
+        except Exception:
+            # a file that is saved half-way or a broken table should not stop the watcher
+            stamp("{}: failed\n{}".format(tbpath, traceback.format_exc()))
+
+    def outdated(self):
+        """Return the corpus files whose output is missing or older than their inputs."""
+        result = []
+        for tbpath in toolbox_io.corpus_files(self.corpath):
+            outpath = os.path.join(self.wripath, os.path.basename(tbpath))
+            inputs = [tbpath] + self.tables(toolbox_io.file_iso(tbpath))
+            if not os.path.exists(outpath) or \
+                    os.path.getmtime(outpath) < max(os.path.getmtime(p) for p in inputs):
+                result.append(tbpath)
+        return result
+
+    def poll(self):
+        """Check the files once, returns the corpus files to process now."""
+        now = time.time()
+        current = snapshot(toolbox_io.corpus_files(self.corpath) + self.tables())
+        for path, state in current.items():
+            if self.seen.get(path) == state:
+                self.pending.pop(path, None)
+            elif path not in self.pending or self.pending[path][:2] != state:
+                # a new change, wait until the file is quiet
+                self.pending[path] = state + (now,)
+        todo = set()
+        for path in (set(self.seen) | set(self.pending)) - set(current):
+            self.seen.pop(path, None)
+            self.pending.pop(path, None)
+            if path.endswith(".xlsx"):
+                # the output of the language no longer follows the rules of the table
+                iso = toolbox_io.file_iso(path)
+                stamp("{}: removed, processing all {} files".format(path, iso))
+                todo.update(f for f in toolbox_io.corpus_files(self.corpath) if toolbox_io.file_iso(f) == iso)
+            else:
+                stamp("{}: removed".format(path))
+
+        for path, (mtime, size, since) in list(self.pending.items()):
+            if now - since < self.delay:
+                continue
+            del self.pending[path]
+            self.seen[path] = (mtime, size)
+            if path.endswith(".xlsx"):
+                iso = toolbox_io.file_iso(path)
+                stamp("{}: changed, processing all {} files".format(path, iso))
+                todo.update(f for f in toolbox_io.corpus_files(self.corpath) if toolbox_io.file_iso(f) == iso)
+            else:
+                todo.add(path)
+        return sorted(todo)
+
+    def start(self):
+        """Process the outdated files and remember the state of all files."""
+        self.seen = snapshot(toolbox_io.corpus_files(self.corpath) + self.tables())
+        for tbpath in self.outdated():
+            self.process(tbpath)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replace items in corpus files whenever they are saved.")
+    parser.add_argument("--corpus", default=corpath, help="folder with the corpus files")
+    parser.add_argument("--tables", default=dicpath, help="folder with the replacement tables")
+    parser.add_argument("--output", default=wripath, help="folder for the new corpus files")
+    parser.add_argument("--lex", default="lxid", choices=("lxid", "lx"))
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks")
+    parser.add_argument("--delay", type=float, default=2.0, help="seconds a file must be unchanged")
+    parser.add_argument("--once", action="store_true", help="only process outdated files and stop")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    watcher = Watcher(args.corpus, args.tables, args.output, args.lex, args.delay)
+    watcher.start()
+    if args.once:
+        return 0
+    stamp("watching {} and {}, stop with Ctrl+C".format(args.corpus, args.tables))
+    try:
+        while True:
+            time.sleep(args.interval)
+            for tbpath in watcher.poll():
+                watcher.process(tbpath)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())